@@ -18,6 +18,7 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from .models import User
 from .serializers import OTPRequestSerializer, OTPVerifySerializer # <-- You will define these
 from django.utils import timezone
+from catalog import guest_cart
 
 def generate_and_send_otp(user):
     otp_code = str(random.randint(100000, 999999))
@@ -64,11 +65,13 @@ class OTPVerifyView(APIView):
         refresh = RefreshToken.for_user(user)
         user.otp = None  # Clear OTP after use
         user.save()
+        merged = guest_cart.merge_into_user_cart(user, guest_cart.token_from_request(request))
 
         return Response({
             "message": "Login successful",
             "refresh": str(refresh),
             "access": str(refresh.access_token),
+            "guest_cart_merged": merged,
         }, status=status.HTTP_200_OK)
 
 @api_view(['PATCH'])
@@ -97,10 +100,12 @@ class LoginView(APIView):
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data["user"]
         refresh = RefreshToken.for_user(user)
+        merged = guest_cart.merge_into_user_cart(user, guest_cart.token_from_request(request))
         return Response({
             "message": "Login successful",
             "refresh": str(refresh),
             "access": str(refresh.access_token),
+            "guest_cart_merged": merged,
         }, status=status.HTTP_200_OK)
 
 
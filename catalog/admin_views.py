@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.views import APIView
 
+from .exporter import EXPORT_FORMATS, export_response
 from .models import Product, ProductImage
 from .serializers import ProductListSerializer,  ProductImageSerializer
 
@@ -53,3 +54,26 @@ class AdminProductImageUploadView(APIView):
             return Response({"detail": "No image file."}, status=400)
         img = ProductImage.objects.create(product=product, image=file, alt=request.data.get("alt", ""))
         return Response(ProductImageSerializer(img, context={"request": request}).data, status=201)
+
+
+class AdminCatalogExportView(APIView):
+    """
+    GET /api/catalog/admin/products/export/?file_format=csv|jsonl
+    Streams the full catalog. Optional filters: seller=<id>, is_active=true|false
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        fmt = request.query_params.get("file_format", "csv")
+        if fmt not in EXPORT_FORMATS:
+            return Response({"detail": "file_format must be csv or jsonl."}, status=400)
+        queryset = Product.objects.all()
+        seller = request.query_params.get("seller")
+        if seller:
+            if not (seller.isascii() and seller.isdigit()):
+                return Response({"detail": "seller must be a user id."}, status=400)
+            queryset = queryset.filter(seller_id=int(seller))
+        is_active = request.query_params.get("is_active")
+        if is_active in ("true", "false"):
+            queryset = queryset.filter(is_active=is_active == "true")
+        return export_response(queryset, fmt, "catalog")
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class CatalogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'catalog'
+
+    def ready(self):
+        from . import checks  # noqa: F401
+        from . import signals  # noqa: F401
+        from . import tasks  # noqa: F401  (registers background tasks)
@@ -0,0 +1,117 @@
+# catalog/bulk.py
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import bump_catalog_version
+from .models import Product
+from .search import index_products
+from .suggest import products_changed
+
+BULK_UPDATE_FIELDS = ("price", "mrp", "stock", "is_active")
+MAX_BULK_UPDATE_ITEMS = 1000
+LOOKUP_CHUNK_SIZE = 1000
+
+
+def _load_seller_products(seller, ids, skus):
+    """Fetches the seller's products by id and sku in chunked IN queries."""
+    by_id, by_sku = {}, {}
+    ids, skus = list(ids), list(skus)
+    for start in range(0, max(len(ids), len(skus)), LOOKUP_CHUNK_SIZE):
+        chunk_ids = ids[start:start + LOOKUP_CHUNK_SIZE]
+        chunk_skus = skus[start:start + LOOKUP_CHUNK_SIZE]
+        queryset = Product.objects.filter(seller=seller).filter(
+            Q(id__in=chunk_ids) | Q(sku__in=chunk_skus)
+        ).only("id", "sku", "reserved", *BULK_UPDATE_FIELDS)
+        for product in queryset:
+            by_id[product.id] = product
+            by_sku[product.sku] = product
+    return by_id, by_sku
+
+
+def _locked_counters(product_ids):
+    """Locks the products in id order (as checkout does) and returns {id: (stock, reserved)}."""
+    ids = sorted(product_ids)
+    counters = {}
+    for start in range(0, len(ids), LOOKUP_CHUNK_SIZE):
+        rows = (
+            Product.objects.select_for_update().filter(pk__in=ids[start:start + LOOKUP_CHUNK_SIZE])
+            .order_by("id").values_list("id", "stock", "reserved")
+        )
+        counters.update((product_id, (stock, reserved)) for product_id, stock, reserved in rows)
+    return counters
+
+
+def _refresh_indexes(product_ids):
+    """bulk_update sends no post_save, so do what the search and suggest receivers would."""
+    ids = list(product_ids)
+    for start in range(0, len(ids), LOOKUP_CHUNK_SIZE):
+        chunk = ids[start:start + LOOKUP_CHUNK_SIZE]
+        products = list(Product.objects.filter(pk__in=chunk).select_related("category"))
+        index_products(products)
+        products_changed(products)
+
+
+def _stock_error(index, product, reserved):
+    return {"index": index, "id": product.id, "sku": product.sku,
+            "detail": f"Stock cannot go below the {reserved} units held by pending checkouts."}
+
+
+def apply_product_changes(seller, changes, batch_size=500):
+    """
+    Applies validated {id|sku, price, mrp, stock, is_active} dicts to the
+    seller's own products with set-based bulk_update statements, then drops
+    the catalog caches once. Returns (updated count, per-row errors).
+    """
+    by_id, by_sku = _load_seller_products(
+        seller,
+        {c["id"] for c in changes if c.get("id") is not None},
+        {c["sku"] for c in changes if c.get("sku")},
+    )
+
+    touched, fields, errors = {}, set(), []
+    for index, change in enumerate(changes):
+        product = by_id.get(change.get("id")) if change.get("id") is not None else by_sku.get(change.get("sku"))
+        if product is None:
+            errors.append({"index": index, "id": change.get("id"), "sku": change.get("sku"),
+                           "detail": "Product not found."})
+            continue
+        if "stock" in change and change["stock"] < product.reserved:
+            errors.append(_stock_error(index, product, product.reserved))
+            continue
+        for field in BULK_UPDATE_FIELDS:
+            if field in change:
+                setattr(product, field, change[field])
+                fields.add(field)
+        changed = touched[product.id][2] if product.id in touched else set()
+        touched[product.id] = (index, product, changed | set(change))
+
+    if not touched:
+        return 0, errors
+    with transaction.atomic():
+        # Re-read the counters under lock: a checkout may have held or sold stock since.
+        counters = _locked_counters(touched)
+        for product_id, (index, product, changed) in list(touched.items()):
+            if product_id not in counters:
+                errors.append({"index": index, "id": product.id, "sku": product.sku, "detail": "Product not found."})
+                del touched[product_id]
+                continue
+            stock, reserved = counters[product_id]
+            if "stock" not in changed:
+                product.stock = stock  # bulk_update writes the column for every row
+            elif product.stock < reserved:
+                errors.append(_stock_error(index, product, reserved))
+                del touched[product_id]
+        if not touched:
+            return 0, errors
+        products = [product for _, product, _ in touched.values()]
+        # bulk_update bypasses auto_now, so stamp updated_at ourselves (ETags depend on it).
+        now = timezone.now()
+        for product in products:
+            product.updated_at = now
+        Product.objects.bulk_update(products, sorted(fields) + ["updated_at"], batch_size=batch_size)
+        product_ids = list(touched)
+        transaction.on_commit(lambda: _refresh_indexes(product_ids))
+        transaction.on_commit(bump_catalog_version)
+    return len(touched), errors
@@ -0,0 +1,62 @@
+# catalog/cache.py
+"""
+Versioned caching for public catalog responses.
+
+Cached entries are keyed by the catalog version, and a bump makes every old
+entry unreachable. This only works across worker processes when the default
+cache is shared (Redis, Memcached); with the per-process LocMemCache each
+worker has its own version. `check --deploy` rejects it (catalog.E001).
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = "catalog:version"
+
+# Cached pages are dropped by version bumps, the timeout only bounds memory.
+CATALOG_CACHE_TIMEOUT = getattr(settings, "CATALOG_CACHE_TIMEOUT", 60 * 60)
+
+
+def get_version(key):
+    """
+    Returns the current number of the version counter stored under `key`.
+    Seeded from the clock so an evicted key never brings back an old version.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    """Moves the version counter stored under `key` to a new number."""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = int(time.time() * 1000)
+        cache.set(key, version, timeout=None)
+        return version
+
+
+def get_catalog_version():
+    """Returns the current catalog version number."""
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    """Invalidates every cached catalog response by moving to a new version."""
+    return bump_version(CATALOG_VERSION_KEY)
+
+
+def catalog_cache_key(prefix, params):
+    """
+    Builds a cache key from a prefix, the catalog version and the given
+    (name, value) pairs. Values are hashed so any client input is a safe key.
+    """
+    raw = "&".join(f"{name}={value}" for name, value in params)
+    digest = hashlib.md5(raw.encode("utf-8")).hexdigest()
+    return f"catalog:{prefix}:{get_catalog_version()}:{digest}"
@@ -0,0 +1,130 @@
+# catalog/cart.py
+"""
+Batch cart mutations.
+
+A batch of add/set/remove operations is folded into one target quantity
+per product. Stock is checked against those final quantities with one
+product query, and the cart is written with one bulk_create, one
+bulk_update and one delete. Either every operation applies or none does.
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import Cart, CartItem, Product
+
+MAX_BATCH_OPERATIONS = 100
+
+
+def add_cart_line(cart, product, qty, **defaults):
+    """
+    Adds qty of product to the cart without a read-modify-write: an F()
+    increment of the existing line, or an insert that falls back to the
+    increment if a concurrent request created the line first.
+    """
+    lines = CartItem.objects.filter(cart=cart, product=product)
+    if lines.update(qty=F("qty") + qty):
+        return
+    try:
+        with transaction.atomic():
+            CartItem.objects.create(cart=cart, product=product, qty=qty, **defaults)
+    except IntegrityError:
+        lines.update(qty=F("qty") + qty)
+
+
+def target_quantities(current, operations):
+    """Folds operations, in order, over {product id: qty}; 0 means removed."""
+    quantities = dict(current)
+    for operation in operations:
+        product_id = operation["product"]
+        if operation["op"] == "add":
+            quantities[product_id] = quantities.get(product_id, 0) + operation["qty"]
+        elif operation["op"] == "set":
+            quantities[product_id] = operation["qty"]
+        else:
+            quantities[product_id] = 0
+    return quantities
+
+
+def stock_errors(operations, products, quantities):
+    """Errors keyed by operation index, in the shape DRF uses for list serializers."""
+    errors = {}
+    for index, operation in enumerate(operations):
+        product = products.get(operation["product"])
+        qty = quantities[operation["product"]]
+        if product is None:
+            if operation["op"] != "remove":
+                errors[str(index)] = {"product": ["Product not found."]}
+        elif qty and not product.is_preorder and product.available_stock < qty:
+            errors[str(index)] = {
+                "qty": [f"Insufficient stock for {product.title}. Only {product.available_stock} left."]
+            }
+    return errors
+
+
+def clamp_to_stock(products, quantities):
+    """Drops unknown products and caps in-stock lines at the available stock."""
+    for product_id, qty in quantities.items():
+        product = products.get(product_id)
+        if product is None:
+            quantities[product_id] = 0
+        elif not product.is_preorder:
+            quantities[product_id] = min(qty, product.available_stock)
+    return quantities
+
+
+@transaction.atomic
+def apply_cart_operations(user, operations, partial=False):
+    """
+    Applies validated CartBatchOperationSerializer data to the user's cart,
+    raising ValidationError (and changing nothing) if any line would be
+    unknown or out of stock. With partial=True such lines are dropped or
+    capped at the available stock instead (used for guest cart merges).
+    """
+    cart, _ = Cart.objects.get_or_create(user=user)
+    # Serializes concurrent batches on the same cart.
+    Cart.objects.select_for_update().filter(pk=cart.pk).first()
+
+    product_ids = {operation["product"] for operation in operations}
+    items = {item.product_id: item for item in cart.items.filter(product_id__in=product_ids)}
+    products = Product.objects.filter(is_active=True).select_related("category").in_bulk(product_ids)
+    quantities = target_quantities({pid: item.qty for pid, item in items.items()}, operations)
+
+    if partial:
+        quantities = clamp_to_stock(products, quantities)
+    else:
+        errors = stock_errors(operations, products, quantities)
+        if errors:
+            raise serializers.ValidationError(errors)
+
+    to_create, to_update, to_delete = [], [], []
+    for product_id, qty in quantities.items():
+        item = items.get(product_id)
+        if not qty:
+            if item is not None:
+                to_delete.append(item.pk)
+        elif item is None:
+            product = products[product_id]
+            # Same snapshots as CartAddView.
+            deposit = product.preorder_deposit if product.is_preorder else product.price + product.gst_amount
+            to_create.append(CartItem(
+                cart=cart, product=product, qty=qty,
+                price_snapshot=product.price, preorder_deposit_snapshot=deposit,
+            ))
+        elif item.qty != qty:
+            item.qty = qty
+            to_update.append(item)
+
+    if to_delete:
+        CartItem.objects.filter(pk__in=to_delete).delete()
+    if to_update:
+        CartItem.objects.bulk_update(to_update, ["qty"])
+    if to_create:
+        # A line added concurrently by CartAddView takes the batch's quantity.
+        CartItem.objects.bulk_create(
+            to_create, update_conflicts=True, unique_fields=["cart", "product"], update_fields=["qty"]
+        )
+    Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now())
+    return cart
@@ -0,0 +1,29 @@
+# catalog/checks.py
+
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+PER_PROCESS_CACHE_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@register(deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Catalog caches are invalidated by bumping a version key in the default
+    cache, so every worker process must share that cache. Runs with
+    `check --deploy`, alongside Django's own deployment checks; an error
+    unless DEBUG is on.
+    """
+    backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+    if backend not in PER_PROCESS_CACHE_BACKENDS:
+        return []
+    level, check_id = (Warning, "catalog.W001") if settings.DEBUG else (Error, "catalog.E001")
+    return [level(
+        f"The default cache ({backend}) is per process.",
+        hint="Catalog version bumps, listing caches and platform settings are only seen by the "
+             "process that made them. Set REDIS_URL, or CACHE_BACKEND to another shared backend.",
+        id=check_id,
+    )]
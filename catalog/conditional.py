@@ -0,0 +1,55 @@
+# catalog/conditional.py
+
+import hashlib
+
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .cache import CATALOG_CACHE_TIMEOUT, catalog_cache_key
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.md5("|".join(str(p) for p in parts).encode("utf-8")).hexdigest())
+
+
+class ConditionalGetMixin:
+    """
+    Answers If-None-Match / If-Modified-Since on GET with a 304 before any
+    object is loaded or serialized. Subclasses implement compute_validators()
+    returning (etag, last_modified datetime) or None; results are cached under
+    the catalog version, so a revalidation usually costs a single cache hit.
+    """
+    validators_cache_prefix = None
+
+    def compute_validators(self):
+        raise NotImplementedError
+
+    def get_validators_cache_params(self):
+        return [("path", self.request.get_full_path())]
+
+    def get_validators(self):
+        key = catalog_cache_key(self.validators_cache_prefix, self.get_validators_cache_params())
+        cached = cache.get(key)
+        if cached is None:
+            validators = self.compute_validators()
+            # Cache misses too, so unknown slugs don't hit the database on every request.
+            cached = (validators,)
+            cache.set(key, cached, CATALOG_CACHE_TIMEOUT)
+        return cached[0]
+
+    def get(self, request, *args, **kwargs):
+        validators = self.get_validators()
+        if validators is None:
+            return super().get(request, *args, **kwargs)
+
+        etag, last_modified = validators
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response.headers["ETag"] = etag
+            if timestamp is not None:
+                response.headers["Last-Modified"] = http_date(timestamp)
+        return response
@@ -0,0 +1,78 @@
+# catalog/exporter.py
+"""
+Streaming catalog export. Products are read from the database in chunks and
+written row by row into a StreamingHttpResponse, so memory stays flat for
+any catalog size.
+"""
+
+import csv
+import json
+from decimal import Decimal
+
+from django.http import StreamingHttpResponse
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+EXPORT_CHUNK_SIZE = 2000
+TWO_PLACES = Decimal("0.01")
+
+EXPORT_COLUMNS = (
+    "id", "sku", "title", "slug", "brand", "category", "price", "mrp", "gst_amount", "price_with_gst",
+    "stock", "is_active", "is_preorder", "preorder_deposit", "available_on",
+    "rating_avg", "rating_count", "updated_at",
+)
+
+
+def export_row(product):
+    """Flattens a product (with category loaded) into export values."""
+    return {
+        "id": product.id,
+        "sku": product.sku,
+        "title": product.title,
+        "slug": product.slug,
+        "brand": product.brand or "",
+        "category": product.category.slug if product.category else "",
+        "price": str(product.price),
+        "mrp": str(product.mrp),
+        "gst_amount": str(product.gst_amount.quantize(TWO_PLACES)),
+        "price_with_gst": str(product.price_with_gst.quantize(TWO_PLACES)),
+        "stock": product.stock,
+        "is_active": product.is_active,
+        "is_preorder": product.is_preorder,
+        "preorder_deposit": str(product.preorder_deposit),
+        "available_on": product.available_on.isoformat() if product.available_on else "",
+        "rating_avg": round(product.rating_avg, 2),
+        "rating_count": product.rating_count,
+        "updated_at": product.updated_at.isoformat(),
+    }
+
+
+class _Echo:
+    """File-like object whose write() hands the line straight back to csv.writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(products):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for product in products:
+        row = export_row(product)
+        yield writer.writerow([row[column] for column in EXPORT_COLUMNS])
+
+
+def iter_jsonl(products):
+    for product in products:
+        yield json.dumps(export_row(product)) + "\n"
+
+
+def export_response(queryset, fmt, filename):
+    """StreamingHttpResponse exporting `queryset` as CSV or JSONL."""
+    products = queryset.select_related("category").order_by("id").iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    rows = iter_csv(products) if fmt == "csv" else iter_jsonl(products)
+    response = StreamingHttpResponse(rows, content_type=EXPORT_FORMATS[fmt])
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{fmt}"'
+    return response
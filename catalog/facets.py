@@ -0,0 +1,229 @@
+# catalog/facets.py
+"""
+Catalog filters and facet counts for the product listing.
+
+All facets are computed in one GROUP BY over (brand, category, preorder,
+in-stock, price range) and rolled up in Python, then cached per filter
+combination under the catalog version, so they are rebuilt at most once
+per catalog change.
+
+Facets are disjunctive: each one is counted with every filter except its
+own, so selecting brand=X still lists the other brands for multi-select.
+Facet filters are columns of the GROUP BY, so this needs no extra queries;
+only min/max price and search are applied in SQL.
+"""
+
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.db.models import BooleanField, Case, CharField, Count, F, Q, Value, When
+from rest_framework.exceptions import ValidationError
+
+from .cache import CATALOG_CACHE_TIMEOUT, catalog_cache_key
+from .search import search_products
+
+# (key, lower bound inclusive, upper bound exclusive or None)
+PRICE_RANGES = (
+    ("0-500", Decimal("0"), Decimal("500")),
+    ("500-1000", Decimal("500"), Decimal("1000")),
+    ("1000-5000", Decimal("1000"), Decimal("5000")),
+    ("5000-20000", Decimal("5000"), Decimal("20000")),
+    ("20000+", Decimal("20000"), None),
+)
+
+# Query params understood by apply_product_filters, in cache key order.
+FILTER_PARAMS = ("category__slug", "brand", "price_range", "min_price", "max_price", "in_stock", "is_preorder")
+
+# Filter param -> facet (and grouped column) it selects on.
+FACET_FILTERS = {
+    "brand": "brand",
+    "category__slug": "category",
+    "price_range": "price_range",
+    "in_stock": "in_stock",
+    "is_preorder": "is_preorder",
+}
+
+TRUE_VALUES = ("1", "true", "yes")
+FALSE_VALUES = ("0", "false", "no")
+
+
+def _price_range_q(key):
+    for range_key, low, high in PRICE_RANGES:
+        if range_key == key:
+            q = Q(price__gte=low)
+            return q & Q(price__lt=high) if high is not None else q
+    raise ValidationError({"price_range": f"Unknown price range '{key}'."})
+
+
+def _decimal_param(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValidationError({name: "Must be a number."})
+
+
+def _bool_param(params, name):
+    value = (params.get(name) or "").lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    return None
+
+
+def _list_param(params, name):
+    return [value.strip() for value in (params.get(name) or "").split(",") if value.strip()]
+
+
+def apply_product_filters(queryset, params):
+    """
+    Applies the listing filters from query params. `brand` and `price_range`
+    accept comma-separated values and match any of them.
+    """
+    category_slug = params.get("category__slug")
+    if category_slug:
+        queryset = queryset.filter(category__slug=category_slug)
+
+    brands = _list_param(params, "brand")
+    if brands:
+        queryset = queryset.filter(brand__in=brands)
+
+    ranges = _list_param(params, "price_range")
+    if ranges:
+        q = Q()
+        for key in ranges:
+            q |= _price_range_q(key)
+        queryset = queryset.filter(q)
+
+    min_price = _decimal_param(params, "min_price")
+    if min_price is not None:
+        queryset = queryset.filter(price__gte=min_price)
+    max_price = _decimal_param(params, "max_price")
+    if max_price is not None:
+        queryset = queryset.filter(price__lte=max_price)
+
+    in_stock = _bool_param(params, "in_stock")
+    if in_stock is True:
+        queryset = queryset.filter(stock__gt=F("reserved"))
+    elif in_stock is False:
+        queryset = queryset.filter(stock__lte=F("reserved"))
+
+    is_preorder = _bool_param(params, "is_preorder")
+    if is_preorder is not None:
+        queryset = queryset.filter(is_preorder=is_preorder)
+
+    return queryset
+
+
+def selected_facets(params):
+    """The facet selections in `params`: facet -> set of accepted values."""
+    selected = {}
+    category_slug = params.get("category__slug")
+    if category_slug:
+        selected["category"] = {category_slug}
+    brands = _list_param(params, "brand")
+    if brands:
+        selected["brand"] = set(brands)
+    ranges = _list_param(params, "price_range")
+    if ranges:
+        for key in ranges:
+            _price_range_q(key)  # validates the key
+        selected["price_range"] = set(ranges)
+    for name in ("in_stock", "is_preorder"):
+        value = _bool_param(params, name)
+        if value is not None:
+            selected[name] = {value}
+    return selected
+
+
+def compute_facets(queryset, selected=None):
+    """
+    Counts every facet of `queryset` with a single grouped query. Each facet
+    honours every selection in `selected` (see selected_facets) except its
+    own; `total` honours all of them.
+    """
+    selected = selected or {}
+    price_range = Case(
+        *[
+            When(Q(price__gte=low) & Q(price__lt=high) if high is not None else Q(price__gte=low), then=Value(key))
+            for key, low, high in PRICE_RANGES
+        ],
+        default=Value(""),
+        output_field=CharField(),
+    )
+    in_stock = Case(When(stock__gt=F("reserved"), then=Value(True)), default=Value(False), output_field=BooleanField())
+    groups = (
+        queryset.order_by()
+        .annotate(facet_price_range=price_range, facet_in_stock=in_stock)
+        .values("brand", "category__slug", "category__name", "is_preorder", "facet_price_range", "facet_in_stock")
+        .annotate(count=Count("id"))
+    )
+
+    brands, categories, prices = {}, {}, {}
+    in_stock_counts = {True: 0, False: 0}
+    preorder_counts = {True: 0, False: 0}
+    total = 0
+    for row in groups:
+        count = row["count"]
+        values = {
+            "brand": row["brand"],
+            "category": row["category__slug"],
+            "price_range": row["facet_price_range"],
+            "in_stock": row["facet_in_stock"],
+            "is_preorder": row["is_preorder"],
+        }
+        misses = [facet for facet, accepted in selected.items() if values[facet] not in accepted]
+        if len(misses) > 1:
+            continue
+        # A row failing only facet F's own selection still counts towards F.
+        missed = misses[0] if misses else None
+        if missed is None:
+            total += count
+        if row["brand"] and missed in (None, "brand"):
+            brands[row["brand"]] = brands.get(row["brand"], 0) + count
+        if row["category__slug"] and missed in (None, "category"):
+            entry = categories.setdefault(row["category__slug"], {"name": row["category__name"], "count": 0})
+            entry["count"] += count
+        if row["facet_price_range"] and missed in (None, "price_range"):
+            prices[row["facet_price_range"]] = prices.get(row["facet_price_range"], 0) + count
+        if missed in (None, "in_stock"):
+            in_stock_counts[row["facet_in_stock"]] += count
+        if missed in (None, "is_preorder"):
+            preorder_counts[row["is_preorder"]] += count
+
+    return {
+        "total": total,
+        "brand": [
+            {"value": brand, "count": count}
+            for brand, count in sorted(brands.items(), key=lambda item: (-item[1], item[0]))
+        ],
+        "category": [
+            {"value": slug, "name": entry["name"], "count": entry["count"]}
+            for slug, entry in sorted(categories.items(), key=lambda item: (-item[1]["count"], item[0]))
+        ],
+        "price_range": [
+            {"value": key, "count": prices[key]} for key, _, _ in PRICE_RANGES if key in prices
+        ],
+        "in_stock": {"true": in_stock_counts[True], "false": in_stock_counts[False]},
+        "is_preorder": {"true": preorder_counts[True], "false": preorder_counts[False]},
+    }
+
+
+def get_facets(queryset, params):
+    """Disjunctive facet counts for the filtered (and searched) listing, cached per filter combination."""
+    names = FILTER_PARAMS + ("search",)
+    key = catalog_cache_key("facets", [(name, (params.get(name) or "").strip()) for name in names])
+    facets = cache.get(key)
+    if facets is None:
+        # Facet selections are applied per facet by compute_facets; the rest here.
+        queryset = apply_product_filters(
+            queryset, {name: params.get(name) for name in FILTER_PARAMS if name not in FACET_FILTERS}
+        )
+        if params.get("search"):
+            queryset = search_products(queryset, params["search"])
+        facets = compute_facets(queryset, selected_facets(params))
+        cache.set(key, facets, CATALOG_CACHE_TIMEOUT)
+    return facets
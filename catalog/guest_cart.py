@@ -0,0 +1,120 @@
+# catalog/guest_cart.py
+"""
+Carts for anonymous shoppers, kept in the cache rather than the database.
+
+A guest cart is a {product id: qty} dict stored under a random id with a
+sliding TTL. Clients hold the id as a signed token (the X-Guest-Cart
+header), so ids cannot be guessed or forged. On login the cart is merged
+into the user's Cart rows with one apply_cart_operations() batch and then
+discarded.
+"""
+
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import serializers
+
+from .cart import apply_cart_operations, clamp_to_stock, stock_errors, target_quantities
+from .models import CartItem, Product
+from .pricing import price_items
+from .serializers import CartSerializer
+
+GUEST_CART_TIMEOUT = getattr(settings, "GUEST_CART_TIMEOUT", 60 * 60 * 24 * 7)
+GUEST_CART_HEADER = "X-Guest-Cart"
+MAX_GUEST_CART_LINES = 100
+
+_signer = signing.Signer(salt="catalog.guest-cart")
+
+
+def new_token():
+    return _signer.sign(uuid.uuid4().hex)
+
+
+def cache_key(token):
+    """Cache key for a signed token, or None if the signature does not check out."""
+    try:
+        cart_id = _signer.unsign(token or "")
+    except signing.BadSignature:
+        return None
+    return f"guest-cart:{cart_id}"
+
+
+def load(token):
+    key = cache_key(token)
+    return (cache.get(key) or {}) if key else {}
+
+
+def save(token, quantities):
+    """Stores the non-empty lines and restarts the TTL."""
+    lines = {product_id: qty for product_id, qty in quantities.items() if qty}
+    cache.set(cache_key(token), lines, GUEST_CART_TIMEOUT)
+    return lines
+
+
+def load_products(product_ids):
+    return (
+        Product.objects.filter(is_active=True)
+        .select_related("category", "primary_image")
+        .in_bulk(product_ids)
+    )
+
+
+def apply_operations(token, operations):
+    """
+    Applies validated CartBatchOperationSerializer data to a guest cart with
+    the same all-or-nothing stock rules as the batch endpoint. Returns the
+    new lines and the products they refer to.
+    """
+    quantities = target_quantities(load(token), operations)
+    products = load_products(set(quantities))
+    errors = stock_errors(operations, products, quantities)
+    if errors:
+        raise serializers.ValidationError(errors)
+    quantities = clamp_to_stock(products, quantities)
+    if sum(1 for qty in quantities.values() if qty) > MAX_GUEST_CART_LINES:
+        raise serializers.ValidationError(f"A guest cart holds at most {MAX_GUEST_CART_LINES} products.")
+    return save(token, quantities), products
+
+
+class GuestCart:
+    """The attributes of a Cart that CartSerializer reads, for unsaved guest lines."""
+    id = None
+    updated_at = None
+
+    def __init__(self, items):
+        self.items = items
+        self.pricing = price_items(items)
+        self.total = self.pricing.total
+
+
+def render(request, token, lines, products=None):
+    """Guest cart payload: exactly CartSerializer's output, plus the token."""
+    if products is None:
+        products = load_products(set(lines))
+    items = [
+        CartItem(product=products[product_id], qty=qty, price_snapshot=products[product_id].price)
+        for product_id, qty in lines.items()
+        if product_id in products
+    ]
+    return {"token": token, **CartSerializer(GuestCart(items), context={"request": request}).data}
+
+
+def merge_into_user_cart(user, token):
+    """
+    Moves a guest cart into the user's cart in one batch, dropping products
+    that are gone and capping quantities at the stock. Returns lines merged.
+    """
+    lines = load(token)
+    if not lines:
+        return 0
+    operations = [{"op": "add", "product": product_id, "qty": qty} for product_id, qty in lines.items()]
+    apply_cart_operations(user, operations, partial=True)
+    transaction.on_commit(lambda: cache.delete(cache_key(token)))
+    return len(lines)
+
+
+def token_from_request(request):
+    return request.data.get("guest_cart_token") or request.headers.get(GUEST_CART_HEADER)
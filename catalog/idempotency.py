@@ -0,0 +1,152 @@
+# catalog/idempotency.py
+"""
+Idempotency-Key support for endpoints that must not run twice.
+
+The first request with a key claims it (an IdempotencyKey row committed
+before the view runs) and stores the response once the view returns.
+A retry with the same key and the same request gets that response back
+without re-running the view. The only exceptions:
+- while the first request is still running, a retry gets 409;
+- the same key with a different request gets 422.
+
+Server errors (5xx or an exception) free the key so the client can retry.
+A claim is a lease of IDEMPOTENCY_LEASE seconds until the response is
+stored, so a key held by a crashed worker can be claimed again. The lease
+must stay well above the slowest request (lock waits, a slow payment
+gateway): a retry that takes over a live request runs it twice. Stored
+responses expire after IDEMPOTENCY_KEY_TTL seconds and are deleted by the
+purge_idempotency_keys command.
+"""
+
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_KEY_TTL = getattr(settings, "IDEMPOTENCY_KEY_TTL", 60 * 60 * 24)
+IDEMPOTENCY_LEASE = getattr(settings, "IDEMPOTENCY_LEASE", 10 * 60)
+CLAIM_ATTEMPTS = 3
+MAX_KEY_LENGTH = 255
+PURGE_BATCH_SIZE = 1000
+
+
+def request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder, default=str)
+    raw = f"{request.method} {request.path}\n{body}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def claim(user, scope, key, fingerprint):
+    """
+    Returns (record, created). An expired record (a stale response, or a
+    lease left by a crashed request) is taken over as a fresh claim. Returns
+    (None, False) if the key keeps changing hands under us.
+    """
+    for _attempt in range(CLAIM_ATTEMPTS):
+        now = timezone.now()
+        lease_until = now + timedelta(seconds=IDEMPOTENCY_LEASE)
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=user, scope=scope, key=key, fingerprint=fingerprint, expires_at=lease_until
+                )
+            return record, True
+        except IntegrityError:
+            pass
+        try:
+            record = IdempotencyKey.objects.get(user=user, scope=scope, key=key)
+        except IdempotencyKey.DoesNotExist:
+            continue  # released by a failed request in the meantime
+        if record.expires_at > now:
+            return record, False
+        taken = IdempotencyKey.objects.filter(pk=record.pk, expires_at__lte=now).update(
+            fingerprint=fingerprint, status="in_progress", response_status=None, response_body=None,
+            expires_at=lease_until,
+        )
+        if taken:
+            record.refresh_from_db()
+            return record, True
+    return None, False
+
+
+def replay(record, fingerprint):
+    if record.fingerprint != fingerprint:
+        return Response(
+            {"detail": f"This {IDEMPOTENCY_HEADER} was already used with a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    if record.status != "completed":
+        return Response(
+            {"detail": f"A request with this {IDEMPOTENCY_HEADER} is still being processed."},
+            status=status.HTTP_409_CONFLICT,
+        )
+    response = Response(record.response_body, status=record.response_status)
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def idempotent(scope):
+    """
+    Decorates an APIView handler (self, request, ...) so that requests
+    carrying an Idempotency-Key header run at most once per user and key.
+    Requests without the header are unaffected.
+    """
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(self, request, *args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return handler(self, request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return Response({"detail": f"{IDEMPOTENCY_HEADER} is too long."},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            fingerprint = request_fingerprint(request)
+            record, created = claim(request.user, scope, key, fingerprint)
+            if record is None:
+                return Response({"detail": f"A request with this {IDEMPOTENCY_HEADER} is still being processed."},
+                                status=status.HTTP_409_CONFLICT)
+            if not created:
+                return replay(record, fingerprint)
+
+            # Matching the lease too, so a request whose key was taken over leaves it alone.
+            claimed = IdempotencyKey.objects.filter(pk=record.pk, expires_at=record.expires_at)
+            try:
+                response = handler(self, request, *args, **kwargs)
+            except Exception:
+                claimed.delete()
+                raise
+            if response.status_code >= 500:
+                claimed.delete()
+                return response
+
+            body = json.loads(json.dumps(response.data, cls=DjangoJSONEncoder))
+            claimed.update(
+                status="completed", response_status=response.status_code, response_body=body,
+                expires_at=timezone.now() + timedelta(seconds=IDEMPOTENCY_KEY_TTL),
+            )
+            return response
+        return wrapper
+    return decorator
+
+
+def purge_expired_keys(batch_size=PURGE_BATCH_SIZE):
+    """Deletes expired keys in batches; returns the number deleted."""
+    deleted = 0
+    while True:
+        ids = list(
+            IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(pk__in=ids).delete()[0]
@@ -0,0 +1,100 @@
+# catalog/images.py
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .cache import bump_catalog_version
+from .models import Product, ProductImage
+
+logger = logging.getLogger(__name__)
+
+# Variant name -> longest edge in pixels.
+IMAGE_VARIANTS = {
+    "thumb": 200,
+    "card": 480,
+    "zoom": 1600,
+}
+VARIANT_FORMAT = "WEBP"
+VARIANT_QUALITY = 80
+
+# 0 processes uploads inline once the transaction commits (handy for tests).
+IMAGE_PROCESSING_WORKERS = getattr(settings, "IMAGE_PROCESSING_WORKERS", 2)
+
+_executor = ThreadPoolExecutor(max_workers=IMAGE_PROCESSING_WORKERS) if IMAGE_PROCESSING_WORKERS else None
+
+
+def refresh_primary_image(product_id):
+    """
+    Points Product.primary_image at the product's first image and touches
+    updated_at, so list/cart serializers can render thumbnails from a join.
+    """
+    first_id = (
+        ProductImage.objects.filter(product_id=product_id)
+        .order_by('position', 'id')
+        .values_list('id', flat=True)
+        .first()
+    )
+    Product.objects.filter(pk=product_id).update(primary_image_id=first_id, updated_at=timezone.now())
+
+
+def render_variant(source, max_edge):
+    """
+    Returns WEBP bytes of `source` scaled to fit `max_edge`. EXIF, ICC and
+    other metadata are not copied to the output.
+    """
+    img = source.copy()
+    img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    buffer = BytesIO()
+    img.save(buffer, VARIANT_FORMAT, quality=VARIANT_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def process_image(image_id):
+    """Generates every variant for a ProductImage and records their storage paths."""
+    product_image = ProductImage.objects.filter(pk=image_id).first()
+    if product_image is None:
+        return
+
+    storage = product_image.image.storage
+    stem = os.path.splitext(os.path.basename(product_image.image.name))[0]
+    try:
+        with product_image.image.open("rb") as f, Image.open(f) as original:
+            # Bake the EXIF orientation into the pixels before the metadata is dropped.
+            source = ImageOps.exif_transpose(original)
+            source = source.convert("RGBA" if source.mode in ("RGBA", "LA", "P") else "RGB")
+            variants = {}
+            for name, max_edge in IMAGE_VARIANTS.items():
+                path = f"products/variants/{stem}_{name}.webp"
+                variants[name] = storage.save(path, ContentFile(render_variant(source, max_edge)))
+    except Exception:
+        logger.exception("Processing product image %s failed", image_id)
+        ProductImage.objects.filter(pk=image_id).update(processing_status="failed")
+        return
+
+    # Queryset updates skip the model signals; bump the version once here instead.
+    ProductImage.objects.filter(pk=image_id).update(variants=variants, processing_status="ready")
+    Product.objects.filter(pk=product_image.product_id).update(updated_at=timezone.now())
+    transaction.on_commit(bump_catalog_version)
+
+
+def _process_in_worker(image_id):
+    try:
+        process_image(image_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_image_processing(image_id):
+    """Queues variant generation for after the current transaction commits."""
+    if _executor is None:
+        transaction.on_commit(lambda: process_image(image_id))
+    else:
+        transaction.on_commit(lambda: _executor.submit(_process_in_worker, image_id))
@@ -0,0 +1,184 @@
+# catalog/importer.py
+"""
+Streaming bulk product import for sellers.
+
+Rows are read one at a time from a CSV or JSONL file, validated with the
+same rules as ProductCreateSerializer, and inserted with bulk_create in
+fixed-size batches, so memory stays bounded whatever the file size.
+
+Bad rows are reported per row. A file that cannot be decoded or parsed
+stops the import at that point and is reported as a file error. A batch
+that hits a slug/SKU collision is retried row by row.
+"""
+
+import csv
+import io
+import json
+
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+
+from .cache import bump_catalog_version
+from .models import Category, Product
+from .search import index_products
+from .serializers import ProductCreateSerializer
+from .suggest import products_changed
+from .utils import generate_product_slug, generate_product_sku
+
+IMPORT_FORMATS = ("csv", "jsonl")
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+
+class CategoryLookupField(serializers.Field):
+    """Resolves a category by id or slug from a map preloaded once per import."""
+
+    def to_internal_value(self, data):
+        category = self.context["categories"].get(str(data).strip())
+        if category is None:
+            raise serializers.ValidationError(f"Unknown category '{data}'.")
+        return category
+
+
+class ProductImportSerializer(ProductCreateSerializer):
+    category = CategoryLookupField(required=False, allow_null=True)
+
+
+def detect_format(filename, requested=None):
+    if requested:
+        fmt = requested.lower()
+    elif filename.lower().endswith(".csv"):
+        fmt = "csv"
+    elif filename.lower().endswith((".jsonl", ".ndjson")):
+        fmt = "jsonl"
+    else:
+        fmt = None
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"Unsupported import format; use one of: {', '.join(IMPORT_FORMATS)}.")
+    return fmt
+
+
+def iter_rows(fileobj, fmt):
+    """
+    Yields (row number, dict) pairs from a binary file object without reading
+    the whole file into memory. Unparseable JSONL lines yield None.
+    """
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        for number, row in enumerate(csv.DictReader(text), start=2):
+            yield number, row
+        return
+    for number, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield number, None
+            continue
+        yield number, row if isinstance(row, dict) else None
+
+
+class ProductImporter:
+    def __init__(self, seller, batch_size=DEFAULT_BATCH_SIZE):
+        self.seller = seller
+        self.batch_size = batch_size
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+        self.file_error = None
+        categories = {}
+        for category in Category.objects.all():
+            categories[str(category.pk)] = category
+            categories[category.slug] = category
+        self.context = {"categories": categories}
+
+    def add_error(self, row_number, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_number, "errors": errors})
+
+    def validate(self, row_number, row):
+        if row is None:
+            self.add_error(row_number, {"non_field_errors": ["Row is not a JSON object."]})
+            return None
+        # Empty CSV cells mean "not provided", not an empty value.
+        data = {key: value for key, value in row.items() if key and value not in ("", None)}
+        serializer = ProductImportSerializer(data=data, context=self.context)
+        if not serializer.is_valid():
+            self.add_error(row_number, serializer.errors)
+            return None
+        fields = serializer.validated_data
+        return Product(
+            seller=self.seller,
+            slug=generate_product_slug(fields["title"]),
+            sku=generate_product_sku(),
+            **fields,
+        )
+
+    def insert(self, products):
+        with transaction.atomic():
+            Product.objects.bulk_create(products)
+            # bulk_create skips post_save, so index the batch here.
+            index_products(products)
+            products_changed(products)
+        self.created += len(products)
+
+    def insert_one(self, row_number, product):
+        """Inserts a row on its own, with fresh slug/sku on a collision."""
+        for _attempt in range(2):
+            try:
+                self.insert([product])
+                return
+            except IntegrityError:
+                product.pk = None
+                product.slug = generate_product_slug(product.title)
+                product.sku = generate_product_sku()
+        self.add_error(row_number, {"non_field_errors": ["Could not generate a unique slug/SKU; retry this row."]})
+
+    def flush(self, batch):
+        """Inserts (row number, product) pairs in one statement, or row by row on a collision."""
+        if not batch:
+            return
+        try:
+            self.insert([product for _, product in batch])
+        except IntegrityError:
+            for row_number, product in batch:
+                self.insert_one(row_number, product)
+
+    def run(self, fileobj, fmt):
+        batch = []
+        row_number = 0
+        rows = iter_rows(fileobj, fmt)
+        while True:
+            try:
+                row_number, row = next(rows)
+            except StopIteration:
+                break
+            # The stream cannot be read past these; keep what was imported so far.
+            except UnicodeDecodeError:
+                self.file_error = "The file is not valid UTF-8 text; the import stopped there."
+                break
+            except csv.Error as exc:
+                self.file_error = f"Malformed CSV after row {row_number}: {exc}."
+                break
+            product = self.validate(row_number, row)
+            if product is not None:
+                batch.append((row_number, product))
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+        self.flush(batch)
+        if self.created:
+            transaction.on_commit(bump_catalog_version)
+        return self.report()
+
+    def report(self):
+        return {
+            "created": self.created,
+            "error_count": self.error_count,
+            "errors": self.errors,
+            "errors_truncated": self.error_count > len(self.errors),
+            "file_error": self.file_error,
+        }
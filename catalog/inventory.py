@@ -0,0 +1,193 @@
+# catalog/inventory.py
+"""
+Time-bounded stock reservations for checkout.
+
+Placing an order holds its lines: Product.reserved grows and a
+StockReservation row records each hold with an expiry. Nothing leaves
+`stock` until the payment succeeds (commit_reservations). A failed payment
+(release_reservations) or an expired hold (release_expired_reservations,
+run by the sweeper command) gives the units back. Available-to-sell is
+simply stock - reserved on the product row.
+
+Every counter change is a single conditional UPDATE over the affected
+products. Checkout locks the rows in id order first, so concurrent
+checkouts cannot deadlock.
+
+Holds and sales don't bump the catalog version unless a product sells out
+or comes back into stock: that is all cached listings and facets depend
+on. The listing view reads the live available counts for each page.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .cache import bump_catalog_version
+from .models import Product, StockReservation
+
+logger = logging.getLogger(__name__)
+
+STOCK_RESERVATION_TTL = getattr(settings, "STOCK_RESERVATION_TTL", 15 * 60)
+RELEASE_BATCH_SIZE = 500
+
+
+class InsufficientStockError(Exception):
+    def __init__(self, products):
+        self.products = products
+        titles = ", ".join(product.title for product in products) or "unknown products"
+        super().__init__(f"Insufficient stock for {titles}.")
+
+
+def _per_product(quantities, expression):
+    """Case(When(pk=..., then=expression(qty)), ...) over {product id: qty}."""
+    return Case(*(When(pk=product_id, then=expression(qty)) for product_id, qty in quantities.items()))
+
+
+def _clamped(field, qty):
+    """max(field - qty, 0), so a counter never trips the positive-integer CHECK."""
+    return Greatest(F(field) - qty, 0, output_field=PositiveIntegerField())
+
+
+def _in_stock(product_ids):
+    """{product id: whether it has units available to sell}."""
+    rows = Product.objects.filter(pk__in=list(product_ids)).values_list("id", "stock", "reserved")
+    return {product_id: stock > reserved for product_id, stock, reserved in rows}
+
+
+def _bump_if_stock_state_changed(before):
+    """Bumps the catalog version after commit if any product in `before` sold out or came back."""
+    if _in_stock(before) != before:
+        transaction.on_commit(bump_catalog_version)
+
+
+def _totals(reservations):
+    quantities = defaultdict(int)
+    for reservation in reservations:
+        quantities[reservation.product_id] += reservation.qty
+    return quantities
+
+
+@transaction.atomic
+def hold_stock(order, quantities, ttl=None):
+    """
+    Reserves {product id: qty} for `order` for `ttl` seconds, for every line
+    or for none, raising InsufficientStockError listing the short products.
+    """
+    if not quantities:
+        return []
+    ids = sorted(quantities)
+    products = list(
+        Product.objects.select_for_update().filter(pk__in=ids).order_by("id").only("id", "title", "stock", "reserved")
+    )
+    short = [product for product in products if product.available_stock < quantities[product.pk]]
+    if short or len(products) != len(ids):
+        raise InsufficientStockError(short)
+
+    # The stock >= reserved + qty guard keeps this safe even where row locks
+    # are not available (SQLite): a line that lost a race is simply not updated.
+    available = Q()
+    for product_id in ids:
+        available |= Q(pk=product_id, stock__gte=F("reserved") + quantities[product_id])
+    updated = Product.objects.filter(available).update(
+        reserved=_per_product(quantities, lambda qty: F("reserved") + qty),
+        updated_at=timezone.now(),
+    )
+    if updated != len(ids):
+        raise InsufficientStockError(products)
+
+    expires_at = timezone.now() + timedelta(seconds=ttl or STOCK_RESERVATION_TTL)
+    reservations = StockReservation.objects.bulk_create([
+        StockReservation(order=order, product_id=product_id, qty=qty, expires_at=expires_at)
+        for product_id, qty in quantities.items()
+    ])
+    # Queryset updates skip the model signals; cached listings change only if a product sold out.
+    if any(product.available_stock == quantities[product.pk] for product in products):
+        transaction.on_commit(bump_catalog_version)
+    return reservations
+
+
+@transaction.atomic
+def commit_reservations(order):
+    """
+    Takes a paid order's held units out of stock. Holds that already expired
+    are re-taken from available stock where possible; lines that can no
+    longer be covered are logged for manual follow-up.
+    """
+    reservations = list(
+        StockReservation.objects.select_for_update()
+        .filter(order=order, status__in=("held", "released"))
+        .order_by("product_id")
+    )
+    held = _totals(r for r in reservations if r.status == "held")
+    lapsed = _totals(r for r in reservations if r.status == "released")
+    before = _in_stock({**held, **lapsed})
+    if held:
+        short = Q()
+        for product_id, qty in held.items():
+            short |= Q(pk=product_id, stock__lt=qty)
+        for product_id in Product.objects.filter(short).values_list("id", flat=True):
+            logger.warning("Order %s was paid but product %s has less stock than it held; stock set to 0",
+                           order.pk, product_id)
+        # Clamped, so a paid order is always recorded even if stock was edited below the hold.
+        Product.objects.filter(pk__in=held).update(
+            stock=_per_product(held, lambda qty: _clamped("stock", qty)),
+            reserved=_per_product(held, lambda qty: _clamped("reserved", qty)),
+            updated_at=timezone.now(),
+        )
+    for product_id, qty in lapsed.items():
+        taken = Product.objects.filter(pk=product_id, stock__gte=F("reserved") + qty).update(
+            stock=F("stock") - qty, updated_at=timezone.now()
+        )
+        if not taken:
+            logger.warning("Order %s was paid after its hold on product %s lapsed and the stock is gone",
+                           order.pk, product_id)
+    StockReservation.objects.filter(pk__in=[r.pk for r in reservations]).update(status="committed")
+    _bump_if_stock_state_changed(before)
+
+
+def _release(reservations):
+    quantities = _totals(reservations)
+    if not quantities:
+        return 0
+    before = _in_stock(quantities)
+    Product.objects.filter(pk__in=quantities).update(
+        reserved=_per_product(quantities, lambda qty: _clamped("reserved", qty)),
+        updated_at=timezone.now(),
+    )
+    StockReservation.objects.filter(pk__in=[r.pk for r in reservations]).update(status="released")
+    _bump_if_stock_state_changed(before)
+    return len(reservations)
+
+
+@transaction.atomic
+def release_reservations(order):
+    """Returns an order's held units to available stock (e.g. its payment failed)."""
+    return _release(list(
+        StockReservation.objects.select_for_update().filter(order=order, status="held").order_by("product_id")
+    ))
+
+
+def release_expired_reservations(batch_size=RELEASE_BATCH_SIZE, now=None):
+    """
+    Releases expired holds in batches of `batch_size`, each in its own short
+    transaction. Rows locked by a concurrent payment are skipped and left
+    for the next run. Returns the number of holds released.
+    """
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                StockReservation.objects.select_for_update(skip_locked=True)
+                .filter(status="held", expires_at__lte=now)
+                .order_by("id")[:batch_size]
+            )
+            released += _release(batch)
+        if len(batch) < batch_size:
+            return released
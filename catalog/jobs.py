@@ -0,0 +1,160 @@
+# catalog/jobs.py
+"""
+A small database-backed job queue.
+
+The request path only inserts a Job row (enqueue), inside its own
+transaction, so a job exists exactly when the order or payment that caused
+it was committed. `manage.py run_jobs` starts worker processes per queue
+(JOB_QUEUES maps queue name -> number of processes). Each worker claims
+ready jobs with SELECT ... FOR UPDATE SKIP LOCKED and runs them.
+
+A task runs in the same transaction that marks its job done, and that
+marker only lands if this worker still holds the job; otherwise the task's
+writes roll back. So its database work is committed exactly once, even if
+a slow job was requeued and picked up elsewhere. Failures are retried with
+exponential backoff until max_attempts. Jobs left `running` by a crashed
+worker are requeued after JOB_LOCK_TIMEOUT seconds; that run counts as an
+attempt, so a job that keeps killing its worker ends up `failed`.
+
+On SQLite, FOR UPDATE is a no-op. The conditional status UPDATE in
+claim_next_job() still makes sure only one worker runs a job.
+"""
+
+import logging
+import os
+import random
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Queue name -> number of worker processes `run_jobs` starts for it.
+JOB_QUEUES = getattr(settings, "JOB_QUEUES", {"default": 2, "notifications": 1})
+JOB_LOCK_TIMEOUT = getattr(settings, "JOB_LOCK_TIMEOUT", 15 * 60)
+JOB_BACKOFF_BASE = getattr(settings, "JOB_BACKOFF_BASE", 10)
+JOB_BACKOFF_MAX = getattr(settings, "JOB_BACKOFF_MAX", 60 * 60)
+
+# Task name -> (function, default queue, max attempts)
+TASKS = {}
+
+
+class JobLost(Exception):
+    """The job was requeued (and maybe claimed again) while this worker ran it."""
+
+
+def task(name=None, queue="default", max_attempts=5):
+    """Registers a function as a job task; it is called with the job payload as kwargs."""
+    def decorator(func):
+        TASKS[name or f"{func.__module__}.{func.__name__}"] = (func, queue, max_attempts)
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, queue=None, delay=0):
+    """Queues a registered task; call it inside the transaction whose outcome it follows."""
+    _func, default_queue, max_attempts = TASKS[name]
+    return Job.objects.create(
+        task=name,
+        payload=payload or {},
+        queue=queue or default_queue,
+        max_attempts=max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def backoff(attempts):
+    """Seconds before retry number `attempts`: exponential, capped, with jitter."""
+    delay = min(JOB_BACKOFF_BASE * 2 ** (attempts - 1), JOB_BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_next_job(queue, worker=None):
+    """Locks and marks running the next ready job on `queue`, or returns None."""
+    now = timezone.now()
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(queue=queue, status="queued", run_after__lte=now)
+            .order_by("run_after", "id")
+            .first()
+        )
+        if job is None:
+            return None
+        claimed = Job.objects.filter(pk=job.pk, status="queued").update(
+            status="running", locked_by=worker or worker_name(), locked_at=now, attempts=F("attempts") + 1
+        )
+    if not claimed:
+        return None
+    job.refresh_from_db()
+    return job
+
+
+def run_job(job):
+    """Runs a claimed job, then marks it done, schedules a retry, or marks it failed."""
+    entry = TASKS.get(job.task)
+    held = Job.objects.filter(pk=job.pk, status="running", locked_by=job.locked_by, locked_at=job.locked_at)
+    try:
+        if entry is None:
+            raise LookupError(f"Unknown task {job.task!r}")
+        with transaction.atomic():
+            entry[0](**job.payload)
+            if not held.update(status="done", finished_at=timezone.now(), last_error=""):
+                raise JobLost(job.pk)
+        return True
+    except JobLost:
+        logger.warning("Job %s (%s) was requeued while running; its work was rolled back", job.pk, job.task)
+        return False
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception("Job %s (%s) failed on attempt %s", job.pk, job.task, job.attempts)
+        if job.attempts >= job.max_attempts or entry is None:
+            held.update(status="failed", finished_at=timezone.now(), last_error=error)
+        else:
+            held.update(
+                status="queued", run_after=timezone.now() + timedelta(seconds=backoff(job.attempts)),
+                locked_by="", locked_at=None, last_error=error,
+            )
+        return False
+
+
+def requeue_stale_jobs(timeout=JOB_LOCK_TIMEOUT):
+    """
+    Puts jobs whose worker died mid-run back on their queue with backoff, or
+    fails them once that run used their last attempt (claiming counted it).
+    Returns how many were requeued.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status="running", locked_at__lt=now - timedelta(seconds=timeout))
+    error = f"Worker stopped responding (no result after {timeout}s)."
+    stale.filter(attempts__gte=F("max_attempts")).update(status="failed", finished_at=now, last_error=error)
+    requeued = 0
+    for job in stale.only("id", "attempts"):
+        requeued += stale.filter(pk=job.pk).update(
+            status="queued", locked_by="", locked_at=None, last_error=error,
+            run_after=now + timedelta(seconds=backoff(job.attempts)),
+        )
+    return requeued
+
+
+def run_pending(queue, limit=None, worker=None):
+    """Runs ready jobs on `queue` until none are left (or `limit`); returns jobs run."""
+    ran = 0
+    while limit is None or ran < limit:
+        job = claim_next_job(queue, worker)
+        if job is None:
+            break
+        run_job(job)
+        ran += 1
+    return ran
@@ -0,0 +1,57 @@
+# catalog/listing.py
+"""
+The public product listing query.
+
+Only the orderings below are accepted from clients; each is backed by a
+composite index on Product (see Product.Meta.indexes) and checked by the
+check_listing_plans management command.
+"""
+
+from .facets import apply_product_filters
+from .models import Product
+from .search import search_products
+
+# Client-facing `ordering` value -> model field ordering. The first is the default.
+PRODUCT_ORDERINGS = {
+    "-created_at": "-created_at",
+    "price": "price",
+    "-price": "-price",
+    # Decayed units sold (see catalog.sales).
+    "bestsellers": "-sales_score_30d",
+    "trending": "-sales_score_7d",
+}
+DEFAULT_ORDERING = "-created_at"
+# Search results without an explicit ordering; search_rank is annotated by search_products.
+RELEVANCE_ORDERING = "-search_rank"
+
+
+def get_ordering(params):
+    """Maps the `ordering` param to a supported field ordering, falling back to the default."""
+    return PRODUCT_ORDERINGS.get(params.get("ordering"), PRODUCT_ORDERINGS[DEFAULT_ORDERING])
+
+
+def applied_ordering(params):
+    """
+    The ordering the listing actually uses for `params`: "relevance" for a
+    search without an explicit ordering, otherwise the resolved client value.
+    """
+    if params.get("search") and not params.get("ordering"):
+        return "relevance"
+    ordering = params.get("ordering")
+    return ordering if ordering in PRODUCT_ORDERINGS else DEFAULT_ORDERING
+
+
+def product_listing_queryset(params):
+    queryset = Product.objects.filter(is_active=True).select_related("category", "seller", "primary_image")
+    queryset = apply_product_filters(queryset, params)
+
+    ordering = get_ordering(params)
+    tie_breaker = "-id" if ordering.startswith("-") else "id"
+    search = params.get("search")
+    if search:
+        queryset = search_products(queryset, search)
+        # Without an explicit ordering, search results come back by relevance.
+        if not params.get("ordering"):
+            return queryset.order_by(RELEVANCE_ORDERING, "-id")
+
+    return queryset.order_by(ordering, tie_breaker)
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from catalog.listing import PRODUCT_ORDERINGS, product_listing_queryset
+from catalog.models import Category, Product
+
+
+def listing_indexes(ordering):
+    """
+    Names of the composite indexes built for a field ordering, as
+    (without category, with category); see Product.Meta.indexes.
+    """
+    field = ordering.lstrip("-")
+    names = {}
+    for index in Product._meta.indexes:
+        fields = [name.lstrip("-") for name in index.fields]
+        if fields == [field, "id"]:
+            names["all"] = index.name
+        elif fields == ["category", field, "id"]:
+            names["category"] = index.name
+    return names.get("all"), names.get("category")
+
+
+def uses_index(plan, names):
+    """True when the plan reads the product table through one of the named indexes."""
+    return any(name and name in plan for name in names)
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs EXPLAIN on every supported product listing query with the planner's "
+        "normal settings and fails unless each plan uses the composite index built "
+        "for its ordering. Run it against a database with production-sized tables: "
+        "on a near-empty table the planner rightly prefers a sequential scan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verbose-plans", action="store_true", help="Print every plan.")
+
+    def listing_cases(self):
+        category = Category.objects.order_by("id").first()
+        slug = category.slug if category else "sample-category"
+        for ordering, field_ordering in PRODUCT_ORDERINGS.items():
+            all_index, category_index = listing_indexes(field_ordering)
+            yield f"ordering={ordering}", {"ordering": ordering}, (all_index,)
+            # The category filter is a join on slug; either index for the ordering serves it.
+            yield (f"ordering={ordering}&category__slug", {"ordering": ordering, "category__slug": slug},
+                   (category_index, all_index))
+
+    def handle(self, *args, **options):
+        failures = []
+        for label, params, expected in self.listing_cases():
+            plan = product_listing_queryset(params)[:12].explain()
+            if options["verbose_plans"]:
+                self.stdout.write(f"-- {label}\n{plan}\n")
+            if uses_index(plan, expected):
+                self.stdout.write(self.style.SUCCESS(f"ok        {label}"))
+            else:
+                failures.append(label)
+                wanted = " or ".join(name for name in expected if name) or "no index defined"
+                self.stdout.write(self.style.ERROR(f"NO INDEX  {label} (expected {wanted})"))
+
+        if failures:
+            raise CommandError(
+                f"{len(failures)} listing queries do not use their {connection.vendor} listing index."
+            )
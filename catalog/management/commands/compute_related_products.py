@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from catalog.related import DEFAULT_TOP_K, compute_related_products
+
+
+class Command(BaseCommand):
+    help = "Recomputes the top-K related products of every active product (run nightly)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K)
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        written = compute_related_products(top_k=options["top_k"], chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Stored {written} related product entries."))
@@ -0,0 +1,40 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.importer import DEFAULT_BATCH_SIZE, ProductImporter, detect_format
+
+
+class Command(BaseCommand):
+    help = "Bulk-imports products for a seller from a CSV or JSONL file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--seller", required=True, help="Seller user id or phone number.")
+        parser.add_argument("--format", dest="file_format", choices=["csv", "jsonl"])
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument("--report", help="Write the per-row error report (JSON) to this path.")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        seller = (
+            User.objects.filter(phone_number=options["seller"]).first()
+            or (User.objects.filter(pk=options["seller"]).first() if options["seller"].isdigit() else None)
+        )
+        if seller is None:
+            raise CommandError(f"Seller '{options['seller']}' not found.")
+        try:
+            fmt = detect_format(options["path"], options["file_format"])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        with open(options["path"], "rb") as f:
+            report = ProductImporter(seller, batch_size=options["batch_size"]).run(f, fmt)
+
+        if options["report"]:
+            with open(options["report"], "w") as out:
+                json.dump(report, out, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {report['created']} products, {report['error_count']} rows rejected."
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from catalog.images import process_image
+from catalog.models import ProductImage
+
+
+class Command(BaseCommand):
+    help = "Generates resized variants for product images that are pending (or failed, with --retry-failed)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--retry-failed", action="store_true")
+
+    def handle(self, *args, **options):
+        statuses = ["pending", "failed"] if options["retry_failed"] else ["pending"]
+        image_ids = list(
+            ProductImage.objects.filter(processing_status__in=statuses).values_list("id", flat=True)
+        )
+        for image_id in image_ids:
+            process_image(image_id)
+        self.stdout.write(self.style.SUCCESS(f"Processed {len(image_ids)} images."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from catalog.idempotency import PURGE_BATCH_SIZE, purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = "Deletes expired Idempotency-Key records (run hourly)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=PURGE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_keys(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency keys."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from catalog.reviews import rebuild_rating_stats
+
+
+class Command(BaseCommand):
+    help = "Recomputes rating_avg, rating_count and the star histogram of every product from its reviews."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        updated = rebuild_rating_stats(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Updated rating stats for {updated} products."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from catalog.sales import rebuild_sales_scores
+
+
+class Command(BaseCommand):
+    help = "Recomputes the bestseller and trending scores of every product from paid orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        updated = rebuild_sales_scores(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Updated sales scores for {updated} products."))
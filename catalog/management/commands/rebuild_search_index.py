@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from catalog.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the product search index from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        total = rebuild_index(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} products."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from catalog.inventory import RELEASE_BATCH_SIZE, release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Returns the stock of expired checkout holds to available stock (run every minute)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=RELEASE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        released = release_expired_reservations(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Released {released} expired stock reservations."))
@@ -0,0 +1,82 @@
+import multiprocessing
+import signal
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+
+from catalog.jobs import JOB_QUEUES, requeue_stale_jobs, run_pending, worker_name
+
+STALE_CHECK_INTERVAL = 60
+
+
+def work(queue, poll_interval, stop):
+    """Worker process body: run ready jobs, sleep when the queue is empty."""
+    # The parent handles Ctrl-C/SIGTERM and tells workers to stop after their current job.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    worker = worker_name()
+    while not stop.is_set():
+        ran = run_pending(queue, limit=100, worker=worker)
+        close_old_connections()
+        if not ran:
+            stop.wait(poll_interval)
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs background jobs. Starts JOB_QUEUES[queue] worker processes for each "
+        "queue (all configured queues by default) until interrupted; --burst runs "
+        "everything that is ready in this process and exits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queue", action="append", dest="queues", help="Queue to serve (repeatable).")
+        parser.add_argument("--burst", action="store_true", help="Drain ready jobs once, then exit.")
+        parser.add_argument("--poll-interval", type=float, default=1.0)
+
+    def handle(self, *args, **options):
+        queues = options["queues"] or list(JOB_QUEUES)
+        requeue_stale_jobs()
+
+        if options["burst"]:
+            ran = sum(run_pending(queue) for queue in queues)
+            self.stdout.write(self.style.SUCCESS(f"Ran {ran} jobs."))
+            return
+
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise CommandError("run_jobs needs the 'fork' start method; use --burst on this platform.")
+        context = multiprocessing.get_context("fork")
+        stop = context.Event()
+        # Children must open their own database connections.
+        connections.close_all()
+
+        def start(queue):
+            process = context.Process(target=work, args=(queue, options["poll_interval"], stop), daemon=True)
+            process.start()
+            return process
+
+        workers = [(queue, start(queue)) for queue in queues for _ in range(max(JOB_QUEUES.get(queue, 1), 1))]
+        self.stdout.write(f"Started {len(workers)} workers for queues: {', '.join(queues)}")
+        # Setting the Event from a signal handler can deadlock on its lock; use a flag.
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+        last_check = time.monotonic()
+        try:
+            while not stopping:
+                time.sleep(1)
+                if time.monotonic() - last_check < STALE_CHECK_INTERVAL:
+                    continue
+                last_check = time.monotonic()
+                requeue_stale_jobs()
+                close_old_connections()
+                for i, (queue, process) in enumerate(workers):
+                    if not process.is_alive():
+                        self.stderr.write(f"Worker for '{queue}' exited ({process.exitcode}); restarting.")
+                        workers[i] = (queue, start(queue))
+        except KeyboardInterrupt:
+            pass
+        stop.set()
+        for _queue, process in workers:
+            process.join()
+        self.stdout.write("Workers stopped.")
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:28
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copy of catalog.search's tokenizer and term weights at the time of
+# this migration, so later changes to search.py don't alter its result.
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+FIELD_WEIGHTS = (
+    ("title", 8),
+    ("sku", 6),
+    ("brand", 5),
+    ("category", 4),
+    ("description", 1),
+)
+MAX_TERM_LENGTH = 64
+MAX_DESCRIPTION_TERMS = 200
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return [t[:MAX_TERM_LENGTH] for t in TOKEN_RE.findall(text.lower())]
+
+
+def build_terms(product):
+    fields = {
+        "title": product.title,
+        "sku": product.sku,
+        "brand": product.brand,
+        "category": product.category.name if product.category else "",
+        "description": product.description,
+    }
+    terms = {}
+    for field, weight in FIELD_WEIGHTS:
+        tokens = tokenize(fields[field])
+        if field == "description":
+            tokens = list(dict.fromkeys(tokens))[:MAX_DESCRIPTION_TERMS]
+        for token in set(tokens):
+            terms[token] = terms.get(token, 0) + weight
+    return terms
+
+
+def build_search_index(apps, schema_editor):
+    Product = apps.get_model('catalog', 'Product')
+    ProductSearchTerm = apps.get_model('catalog', 'ProductSearchTerm')
+    rows = []
+    for product in Product.objects.select_related('category').iterator(chunk_size=500):
+        rows.extend(
+            ProductSearchTerm(product_id=product.pk, term=term, weight=weight)
+            for term, weight in build_terms(product).items()
+        )
+        if len(rows) >= 5000:
+            ProductSearchTerm.objects.bulk_create(rows)
+            rows = []
+    ProductSearchTerm.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0004_remove_product_is_prebook_enabled_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(db_index=True, max_length=64)),
+                ('weight', models.PositiveIntegerField(default=1)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='catalog.product')),
+            ],
+            options={
+                'unique_together': {('product', 'term')},
+            },
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
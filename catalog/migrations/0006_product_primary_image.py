@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def set_primary_images(apps, schema_editor):
+    Product = apps.get_model('catalog', 'Product')
+    ProductImage = apps.get_model('catalog', 'ProductImage')
+    first_images = (
+        ProductImage.objects.values('product_id').annotate(first_id=Min('id')).values_list('product_id', 'first_id')
+    )
+    for product_id, first_id in first_images.iterator():
+        Product.objects.filter(pk=product_id).update(primary_image_id=first_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_product_search_term'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='productimage',
+            options={'ordering': ('position', 'id')},
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='primary_image',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='catalog.productimage'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='position',
+            field=models.PositiveIntegerField(default=0, help_text='Display order; the lowest position is the primary image.'),
+        ),
+        migrations.RunPython(set_primary_images, migrations.RunPython.noop),
+    ]
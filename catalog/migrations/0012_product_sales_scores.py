@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:39
+
+import math
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+# Frozen copy of catalog.sales' score parameters at the time of this migration,
+# so moving SCORE_EPOCH later doesn't change what this backfill computes
+# (rebuild_sales_scores re-bases existing scores).
+SCORE_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+SCORE_WINDOWS = {
+    'sales_score_7d': 7,
+    'sales_score_30d': 30,
+}
+
+
+def weight_at(moment, days):
+    return math.exp((moment - SCORE_EPOCH).total_seconds() / (days * 86400))
+
+
+def backfill_sales_scores(apps, schema_editor):
+    Product = apps.get_model('catalog', 'Product')
+    OrderItem = apps.get_model('catalog', 'OrderItem')
+    rows = (
+        OrderItem.objects.filter(order__status__in=('paid', 'shipped', 'delivered'))
+        .values('product_id', 'order__created_at')
+        .annotate(units=Sum('qty'))
+        .order_by()
+    )
+    scores = {}
+    for row in rows.iterator():
+        product_scores = scores.setdefault(row['product_id'], dict.fromkeys(SCORE_WINDOWS, 0.0))
+        for field, days in SCORE_WINDOWS.items():
+            product_scores[field] += row['units'] * weight_at(row['order__created_at'], days)
+    for product_id, values in scores.items():
+        Product.objects.filter(pk=product_id).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_related_product'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='sales_score_30d',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='sales_score_7d',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-sales_score_30d', '-id'], name='product_active_best_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category', '-sales_score_30d', '-id'], name='product_cat_best_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-sales_score_7d', '-id'], name='product_active_trend_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category', '-sales_score_7d', '-id'], name='product_cat_trend_idx'),
+        ),
+        migrations.RunPython(backfill_sales_scores, migrations.RunPython.noop),
+    ]
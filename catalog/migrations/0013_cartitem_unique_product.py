@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:41
+
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    CartItem = apps.get_model('catalog', 'CartItem')
+    duplicates = (
+        CartItem.objects.values('cart_id', 'product_id')
+        .annotate(lines=Count('id'), keep_id=Min('id'), total_qty=Sum('qty'))
+        .filter(lines__gt=1)
+        .order_by()
+    )
+    for row in duplicates.iterator():
+        CartItem.objects.filter(pk=row['keep_id']).update(qty=row['total_qty'])
+        CartItem.objects.filter(cart_id=row['cart_id'], product_id=row['product_id']).exclude(
+            pk=row['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0012_product_sales_scores'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='cartitem',
+            unique_together={('cart', 'product')},
+        ),
+    ]
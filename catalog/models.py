@@ -1,10 +1,15 @@
 # store/models.py
 
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.text import slugify
 from decimal import Decimal
 
+from .pricing import price_cart, price_cart_item, price_line, price_order
+
 # Reference the custom user model from your accounts app
 User = settings.AUTH_USER_MODEL
 
@@ -48,6 +53,7 @@ class Category(models.Model):
         upload_to='category_icons/', blank=True, null=True,
         help_text="Optional category image or icon for UI display."
     )
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = "Categories"
@@ -88,12 +94,76 @@ class Product(models.Model):
     )
 
     stock = models.PositiveIntegerField(default=0)
+    # Units held by unexpired checkout reservations (see catalog.inventory).
+    reserved = models.PositiveIntegerField(default=0, editable=False)
     brand = models.CharField(max_length=100, blank=True, null=True)
     sku = models.CharField(max_length=50, unique=True, blank=True)
     is_active = models.BooleanField(default=True)
+    # Denormalized review aggregates, maintained by catalog.reviews.
+    rating_avg = models.FloatField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_1 = models.PositiveIntegerField(default=0, editable=False)
+    rating_2 = models.PositiveIntegerField(default=0, editable=False)
+    rating_3 = models.PositiveIntegerField(default=0, editable=False)
+    rating_4 = models.PositiveIntegerField(default=0, editable=False)
+    rating_5 = models.PositiveIntegerField(default=0, editable=False)
+    # Exponentially decayed units sold, stored relative to catalog.sales.SCORE_EPOCH so
+    # paid orders only ever add to them. Maintained by catalog.sales.
+    sales_score_7d = models.FloatField(default=0, editable=False)
+    sales_score_30d = models.FloatField(default=0, editable=False)
+    # Denormalized first image (by ProductImage ordering), maintained by catalog.images.
+    primary_image = models.ForeignKey(
+        'ProductImage', on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='+', editable=False
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # One index per supported listing ordering (catalog.listing.PRODUCT_ORDERINGS),
+        # with and without the category filter. They are partial on is_active, which
+        # keeps them small and lets both Postgres and SQLite use them for the listing.
+        # Checked by `manage.py check_listing_plans`.
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(is_active=True),
+                         name='product_active_created_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], condition=models.Q(is_active=True),
+                         name='product_cat_created_idx'),
+            models.Index(fields=['price', 'id'], condition=models.Q(is_active=True),
+                         name='product_active_price_idx'),
+            models.Index(fields=['category', 'price', 'id'], condition=models.Q(is_active=True),
+                         name='product_cat_price_idx'),
+            models.Index(fields=['-sales_score_30d', '-id'], condition=models.Q(is_active=True),
+                         name='product_active_best_idx'),
+            models.Index(fields=['category', '-sales_score_30d', '-id'], condition=models.Q(is_active=True),
+                         name='product_cat_best_idx'),
+            models.Index(fields=['-sales_score_7d', '-id'], condition=models.Q(is_active=True),
+                         name='product_active_trend_idx'),
+            models.Index(fields=['category', '-sales_score_7d', '-id'], condition=models.Q(is_active=True),
+                         name='product_cat_trend_idx'),
+        ]
+
+    # Maintained with F() updates by catalog.inventory/reviews/sales/images. A full
+    # save() of a stale instance must not write them back.
+    COUNTER_FIELDS = (
+        'reserved', 'rating_avg', 'rating_count', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5',
+        'sales_score_7d', 'sales_score_30d', 'primary_image',
+    )
+
+    def save(self, *args, **kwargs):
+        if (self.pk is not None and not self._state.adding
+                and kwargs.get('update_fields') is None and not kwargs.get('force_insert')):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    def clean(self):
+        super().clean()
+        if self.stock is not None and self.stock < self.reserved:
+            raise ValidationError({'stock': f'Stock cannot go below the {self.reserved} units held by pending checkouts.'})
+
     @property
     def gst_amount(self):
         if self.price is None or self.category is None:
@@ -107,6 +177,15 @@ class Product(models.Model):
     def price_with_gst(self):
         return self.price + self.gst_amount
 
+    @property
+    def available_stock(self):
+        """Units that can still be sold: stock not held by a pending checkout."""
+        return max(self.stock - self.reserved, 0)
+
+    @property
+    def rating_histogram(self):
+        return {str(star): getattr(self, f'rating_{star}') for star in range(1, 6)}
+
     def __str__(self):
         return self.title
 
@@ -116,11 +195,57 @@ class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='products/')
     alt = models.CharField(max_length=150, blank=True, help_text="Alternative text for the image")
+    position = models.PositiveIntegerField(default=0, help_text="Display order; the lowest position is the primary image.")
+    # Resized copies (thumb, card, zoom) generated in the background by catalog.images.
+    PROCESSING_CHOICES = (
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    )
+    processing_status = models.CharField(max_length=10, choices=PROCESSING_CHOICES, default='pending')
+    variants = models.JSONField(default=dict, blank=True, help_text="Variant name -> storage path.")
+
+    class Meta:
+        ordering = ('position', 'id')
 
     def __str__(self):
         return f"Image for {self.product.title}"
 
 
+class ProductSearchTerm(models.Model):
+    """
+    One row per (product, term) of the inverted search index.
+    Maintained by catalog.search whenever a product or its category changes.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=64, db_index=True)
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        unique_together = ('product', 'term')
+
+    def __str__(self):
+        return f"{self.term} -> {self.product_id}"
+
+
+class RelatedProduct(models.Model):
+    """
+    Precomputed top-K recommendations for a product, written offline by
+    catalog.related (see the compute_related_products command).
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_entries')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ('product', 'rank')
+        ordering = ('product', 'rank')
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} (#{self.rank})"
+
+
 class Review(models.Model):
     # ... (no changes here)
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reviews')
@@ -131,6 +256,10 @@ class Review(models.Model):
 
     class Meta:
         unique_together = ('product', 'user')
+        indexes = [
+            models.Index(fields=['product', '-created_at', '-id'], name='review_product_recent_idx'),
+            models.Index(fields=['product', '-rating', '-id'], name='review_product_rating_idx'),
+        ]
 
 
 class Cart(models.Model):
@@ -139,9 +268,14 @@ class Cart(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    @cached_property
+    def pricing(self):
+        """All cart totals, computed in one pass and memoized (see catalog.pricing)."""
+        return price_cart(self)
+
     @property
     def total(self):
-        return sum(item.subtotal for item in self.items.all())
+        return self.pricing.total
 
 
 class CartItem(models.Model):
@@ -156,27 +290,25 @@ class CartItem(models.Model):
         default=Decimal('0.00')
     )
 
+    class Meta:
+        # One line per product; CartAddView increments it in place (see catalog.cart).
+        unique_together = ('cart', 'product')
+
+    @cached_property
+    def pricing(self):
+        return price_cart_item(self)
+
     @property
     def subtotal(self):
-        # The logic should be directly under the @property decorator.
-        if self.price_snapshot is None:
-            return Decimal('0.00')
-        return self.qty * self.price_snapshot
+        return self.pricing.subtotal
 
     @property
     def gst_amount(self):
-        if self.subtotal is None or self.product.category is None:
-            return Decimal('0.00')
-
-        if self.product.category.gst_rate is not None:
-            gst_rate = self.product.category.gst_rate
-            # subtotal is Decimal('0.00') if qty/price are None (from previous fix)
-            return (self.subtotal * gst_rate) / Decimal('100')
-        return Decimal('0.00')
+        return self.pricing.gst_amount
 
     @property
     def total_with_gst(self):
-        return self.subtotal + self.gst_amount
+        return self.pricing.total_with_gst
 
 
 # ✨ ADDED: Address model for managing user shipping addresses.
@@ -244,59 +376,27 @@ class Order(models.Model):
     shipped_at = models.DateTimeField(blank=True, null=True)
 
     # ♻️ REFACTORED: The calculate_totals method now includes deposit logic.
-    def calculate_totals(self):
-        # Ensure sum starts with Decimal('0.00') for safety
-        order_subtotal = sum((item.subtotal for item in self.items.all()), Decimal('0.00'))
-        order_gst = sum((item.gst_amount for item in self.items.all()), Decimal('0.00'))
-        settings, _ = PlatformSettings.objects.get_or_create(pk=1)
-
-        # 1. Calculate the FULL gross total (for reference/remaining due calculation)
-        full_gross_total = order_subtotal + order_gst
-
-        # 2. Determine the immediate payment required (Deposit + Full Price for non-preorder items)
-        # Check if ANY item is a pre-order item to flag the entire order
-        self.is_preorder_order = any(
-            getattr(item.product, 'is_preorder', False)
-            for item in self.items.all()
+    def calculate_totals(self, commission_rate):
+        """
+        Prices the order from its lines (one query) with catalog.pricing and
+        writes every total, rounded as stored, back in a single UPDATE. The
+        voucher is claimed with a conditional UPDATE, so it can only discount
+        one order. `commission_rate` is the platform commission percentage.
+        """
+        rows = self.items.values_list(
+            'qty', 'price_snapshot', 'product__category__gst_rate',
+            'product__is_preorder', 'product__preorder_deposit',
         )
-        # Calculate the sum of required deposit amounts (or full price for standard items)
-        deposit_sum_required = Decimal('0.00')
-        for item in self.items.all():
-            is_preorder = getattr(item.product, 'is_preorder', False)
-            if is_preorder:
-                # Use the deposit snapshot * quantity
-                # Safely access 'preorder_deposit_snapshot' which must be added to CartItem model
-                deposit_snap = getattr(item, 'preorder_deposit_snapshot', item.price_snapshot) 
-                deposit_sum_required += (deposit_snap * item.qty)
-            else:
-                # Use the item's full gross price for standard items
-                deposit_sum_required += (item.subtotal + item.gst_amount)
-
-        # 3. Apply Voucher Discount
+        lines = [price_line(*row) for row in rows]
+
         discount = Decimal('0.00')
-        if self.voucher and not self.voucher.is_used:
+        if self.voucher_id and Voucher.objects.filter(pk=self.voucher_id, is_used=False).update(is_used=True):
             discount = self.voucher.value
-            self.voucher.is_used = True
-            self.voucher.save()
-        self.discount_amount = discount
-
-        # 4. Finalize Totals
-        self.subtotal = order_subtotal
-        self.gst_amount = order_gst
-        self.commission = (order_subtotal * settings.platform_commission_rate) / Decimal('100')
-
-        # The actual amount due NOW after discount
-        self.deposit_amount = deposit_sum_required - self.discount_amount
-        # The remaining amount (Total Full Price - Deposit Paid)
-        self.remaining_due = full_gross_total - self.deposit_amount
-        # CRITICAL: self.total holds the amount the customer pays NOW at checkout.
-        self.total = self.deposit_amount
-
-        # Ensure remaining_due is not negative (in case discount exceeded the deposit)
-        if self.remaining_due < Decimal('0.00'):
-            self.remaining_due = Decimal('0.00')
-        # 💥 CRITICAL FIX: The save method must be called to persist changes 💥
-        self.save()
+
+        totals = price_order(lines, commission_rate, discount).rounded()._asdict()
+        Order.objects.filter(pk=self.pk).update(**totals)
+        for field, value in totals.items():
+            setattr(self, field, value)
 
     def __str__(self):
         return f"Order #{self.id} by {self.user.email}"
@@ -327,6 +427,59 @@ class OrderItem(models.Model):
         return Decimal('0.00')
 
 
+class StockReservation(models.Model):
+    """
+    Stock held for an unpaid order. Counted in Product.reserved until the
+    payment succeeds (committed: taken from stock), fails, or the hold
+    expires (released). Managed by catalog.inventory.
+    """
+    STATUS_CHOICES = (
+        ('held', 'Held'),
+        ('committed', 'Committed'),
+        ('released', 'Released'),
+    )
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='stock_reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    qty = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='held')
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'expires_at'], name='reservation_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.qty} x {self.product_id} for order {self.order_id} ({self.status})"
+
+
+class IdempotencyKey(models.Model):
+    """
+    A client-supplied Idempotency-Key with the response it produced, so a
+    retried request is answered without running again. See catalog.idempotency.
+    """
+    STATUS_CHOICES = (
+        ('in_progress', 'In progress'),
+        ('completed', 'Completed'),
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    scope = models.CharField(max_length=50)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default='in_progress')
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ('user', 'scope', 'key')
+
+    def __str__(self):
+        return f"{self.scope}:{self.key} ({self.status})"
+
+
 class Voucher(models.Model):
     # ... (no changes here)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='vouchers')
@@ -360,3 +513,38 @@ class PaymentTransaction(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='initiated')
     gateway_response = models.JSONField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+
+
+class Job(models.Model):
+    """
+    A unit of background work, claimed by `run_jobs` workers with
+    SELECT ... FOR UPDATE SKIP LOCKED. See catalog.jobs.
+    """
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    queue = models.CharField(max_length=50, default='default')
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['queue', 'run_after', 'id'], condition=models.Q(status='queued'),
+                         name='job_ready_idx'),
+            models.Index(fields=['locked_at'], condition=models.Q(status='running'), name='job_running_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} [{self.queue}] ({self.status})"
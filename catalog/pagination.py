@@ -0,0 +1,159 @@
+# catalog/pagination.py
+
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import IntegerField, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .listing import PRODUCT_ORDERINGS, RELEVANCE_ORDERING, applied_ordering
+
+
+def _reject_constant(name):
+    raise ValueError(f"{name} is not allowed in a cursor")
+
+
+class StandardPagination(PageNumberPagination):
+    page_size = 12
+    page_size_query_param = "page_size"
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only cursor pagination on (ordering field, id).
+    Each page is a single indexed range scan, so page 200 costs the same as
+    page 1, and rows inserted while a client scrolls never shift the pages.
+    The COUNT(*) is skipped unless the client asks for it.
+    """
+    page_size = 12
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    count_query_param = "include_count"
+    ordering_query_param = "ordering"
+    invalid_cursor_message = "Invalid cursor."
+    max_tie_value = 2 ** 63 - 1
+
+    # Subclasses map the `ordering` values clients may pick to a model field
+    # ordering; the first entry is the default.
+    orderings = {}
+    tie_breaker = "id"
+    # Annotations (rather than model fields) an ordering may use, with their field type.
+    annotated_fields = {}
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_ordering(self, request, view=None):
+        ordering = request.query_params.get(self.ordering_query_param)
+        if ordering not in self.orderings:
+            ordering = next(iter(self.orderings))
+        return self.orderings[ordering]
+
+    def get_cursor_field(self, field_name):
+        if field_name in self.annotated_fields:
+            return self.annotated_fields[field_name]
+        return self.queryset.model._meta.get_field(field_name)
+
+    def encode_cursor(self, ordering, obj):
+        field_name = ordering.lstrip("-")
+        if field_name in self.annotated_fields:
+            value = getattr(obj, field_name)
+        else:
+            value = self.get_cursor_field(field_name).value_to_string(obj)
+        raw = json.dumps([ordering, value, getattr(obj, self.tie_breaker)])
+        return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+    def decode_cursor(self, request, ordering):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            decoded = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")), parse_constant=_reject_constant)
+            if not isinstance(decoded, list):
+                raise ValueError("cursor is not a list")
+            cursor_ordering, value, tie_value = decoded
+            # Cursors are built by encode_cursor: a scalar field value and an integer id.
+            if not isinstance(value, (str, int, float)) or isinstance(value, bool):
+                raise ValueError("bad cursor value")
+            if not isinstance(tie_value, int) or isinstance(tie_value, bool) or abs(tie_value) > self.max_tie_value:
+                raise ValueError("bad cursor id")
+            field = self.get_cursor_field(ordering.lstrip("-"))
+            value = field.to_python(value)
+        except (TypeError, ValueError, UnicodeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if cursor_ordering != ordering or value is None:
+            raise NotFound(self.invalid_cursor_message)
+        return value, tie_value
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.queryset = queryset
+        self.ordering = self.get_ordering(request, view)
+        self.page_size = self.get_page_size(request)
+
+        descending = self.ordering.startswith("-")
+        field_name = self.ordering.lstrip("-")
+        tie = f"-{self.tie_breaker}" if descending else self.tie_breaker
+
+        self.count = None
+        if request.query_params.get(self.count_query_param) in ("1", "true"):
+            self.count = queryset.count()
+
+        queryset = queryset.order_by(self.ordering, tie)
+        cursor = self.decode_cursor(request, self.ordering)
+        if cursor is not None:
+            value, tie_value = cursor
+            op = "lt" if descending else "gt"
+            queryset = queryset.filter(
+                Q(**{f"{field_name}__{op}": value})
+                | Q(**{field_name: value, f"{self.tie_breaker}__{op}": tie_value})
+            )
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.ordering, self.page[-1]))
+
+    def get_first_link(self):
+        return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+
+    def get_paginated_response(self, data):
+        payload = {"next": self.get_next_link(), "first": self.get_first_link()}
+        if self.count is not None:
+            payload["count"] = self.count
+        payload["results"] = data
+        return Response(payload)
+
+
+class ProductKeysetPagination(KeysetPagination):
+    orderings = PRODUCT_ORDERINGS
+    annotated_fields = {"search_rank": IntegerField()}
+
+    def get_ordering(self, request, view=None):
+        # Search results default to relevance; the cursor then carries (search_rank, id).
+        if applied_ordering(request.query_params) == "relevance":
+            return RELEVANCE_ORDERING
+        return super().get_ordering(request, view)
+
+
+class ReviewKeysetPagination(KeysetPagination):
+    ordering_query_param = "sort"
+    orderings = {
+        "recent": "-created_at",
+        "highest": "-rating",
+    }
@@ -0,0 +1,45 @@
+# catalog/platform_settings.py
+"""
+Read-through cache for the PlatformSettings singleton.
+
+Hot paths (checkout, pricing) call get_platform_settings(), which serves
+from a process-local copy and, once that expires, from the shared cache;
+the database is only read after a save. Saving or deleting the row (e.g.
+from PlatformSettingsAdmin) invalidates both (see catalog.signals). Other
+processes pick the change up within PLATFORM_SETTINGS_LOCAL_TTL seconds
+with a shared cache, or PLATFORM_SETTINGS_CACHE_TIMEOUT + LOCAL_TTL
+seconds when each process has its own cache.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import PlatformSettings
+
+PLATFORM_SETTINGS_CACHE_KEY = "platform-settings"
+PLATFORM_SETTINGS_LOCAL_TTL = getattr(settings, "PLATFORM_SETTINGS_LOCAL_TTL", 10)
+PLATFORM_SETTINGS_CACHE_TIMEOUT = getattr(settings, "PLATFORM_SETTINGS_CACHE_TIMEOUT", 60)
+
+_local = None  # (instance, monotonic expiry)
+
+
+def get_platform_settings():
+    """The settings row, shared between callers: treat it as read-only."""
+    global _local
+    now = time.monotonic()
+    if _local is not None and _local[1] > now:
+        return _local[0]
+    instance = cache.get(PLATFORM_SETTINGS_CACHE_KEY)
+    if instance is None:
+        instance, _ = PlatformSettings.objects.get_or_create(pk=1)
+        cache.set(PLATFORM_SETTINGS_CACHE_KEY, instance, PLATFORM_SETTINGS_CACHE_TIMEOUT)
+    _local = (instance, now + PLATFORM_SETTINGS_LOCAL_TTL)
+    return instance
+
+
+def invalidate_platform_settings():
+    global _local
+    _local = None
+    cache.delete(PLATFORM_SETTINGS_CACHE_KEY)
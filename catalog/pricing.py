@@ -0,0 +1,112 @@
+# catalog/pricing.py
+"""
+Cart and order pricing.
+
+price_line() is a pure function of a line's quantity, unit price, GST rate
+and preorder terms. price_cart() walks a cart's items once and returns every
+line and cart total together; Cart.pricing and CartItem.pricing memoize the
+results on the instances, so the serializer never recomputes a total.
+price_order() turns priced lines into an order's totals without touching
+the database, for Order.calculate_totals and checkout previews alike.
+"""
+
+from decimal import ROUND_HALF_UP, Decimal
+from typing import NamedTuple
+
+ZERO = Decimal("0.00")
+TWO_PLACES = Decimal("0.01")
+HUNDRED = Decimal("100")
+
+
+class LinePrice(NamedTuple):
+    subtotal: Decimal
+    gst_amount: Decimal
+    total_with_gst: Decimal
+    # Payable now: the deposit for preorder lines, the full price otherwise.
+    amount_due: Decimal
+    is_preorder: bool = False
+
+
+class CartPrice(NamedTuple):
+    total: Decimal
+    total_gst: Decimal
+    grand_total: Decimal
+    total_deposit_due: Decimal
+    total_full_price: Decimal
+
+
+def round_money(value):
+    return value.quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+
+
+def price_line(qty, unit_price, gst_rate=None, is_preorder=False, deposit=None):
+    subtotal = qty * unit_price if unit_price is not None else ZERO
+    gst_amount = subtotal * gst_rate / HUNDRED if gst_rate is not None else ZERO
+    total_with_gst = subtotal + gst_amount
+    amount_due = (deposit or ZERO) * qty if is_preorder else total_with_gst
+    return LinePrice(subtotal, gst_amount, total_with_gst, amount_due, bool(is_preorder))
+
+
+def price_cart_item(item):
+    product = item.product
+    gst_rate = product.category.gst_rate if product.category_id else None
+    return price_line(item.qty, item.price_snapshot, gst_rate, product.is_preorder, product.preorder_deposit)
+
+
+def price_cart(cart):
+    """Totals for a cart in one pass over cart.items.all() (prefetch items__product__category)."""
+    return price_items(cart.items.all())
+
+
+def price_items(items):
+    """Cart totals over CartItem instances, saved or not."""
+    total = total_gst = total_due = ZERO
+    for item in items:
+        line = item.pricing
+        total += line.subtotal
+        total_gst += line.gst_amount
+        total_due += line.amount_due
+    grand_total = total + total_gst
+    return CartPrice(total, total_gst, grand_total, total_due, grand_total)
+
+
+class OrderPrice(NamedTuple):
+    subtotal: Decimal
+    gst_amount: Decimal
+    is_preorder_order: bool
+    deposit_amount: Decimal
+    remaining_due: Decimal
+    discount_amount: Decimal
+    commission: Decimal
+    # Amount the customer pays now, at checkout.
+    total: Decimal
+
+    def rounded(self):
+        """Every amount rounded to two places, as Order's DecimalFields store them."""
+        return self._replace(**{
+            name: round_money(value) for name, value in self._asdict().items() if isinstance(value, Decimal)
+        })
+
+
+def price_order(lines, commission_rate, discount=ZERO):
+    """Order totals from LinePrice rows, in one pass; field names match Order."""
+    subtotal = gst_amount = amount_due = ZERO
+    is_preorder_order = False
+    for line in lines:
+        subtotal += line.subtotal
+        gst_amount += line.gst_amount
+        amount_due += line.amount_due
+        is_preorder_order = is_preorder_order or line.is_preorder
+
+    deposit_amount = amount_due - discount
+    remaining_due = max(subtotal + gst_amount - deposit_amount, ZERO)
+    return OrderPrice(
+        subtotal=subtotal,
+        gst_amount=gst_amount,
+        is_preorder_order=is_preorder_order,
+        deposit_amount=deposit_amount,
+        remaining_due=remaining_due,
+        discount_amount=discount,
+        commission=subtotal * commission_rate / HUNDRED,
+        total=deposit_amount,
+    )
@@ -0,0 +1,134 @@
+# catalog/related.py
+"""
+Offline "related products" computation.
+
+Candidates for a product are its price neighbours in the same category and
+the same brand, plus everything bought in the same orders. Each candidate is
+scored on those signals and the top K are stored in RelatedProduct, so the
+detail page reads recommendations with one indexed lookup.
+"""
+
+import math
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.db import transaction
+
+from .cache import bump_catalog_version
+from .models import OrderItem, Product, RelatedProduct
+
+DEFAULT_TOP_K = 12
+# Price neighbours taken on each side within a category or brand.
+PRICE_WINDOW = 25
+# Orders with more lines than this are skipped for co-purchase counting (bulk/B2B orders).
+MAX_ORDER_LINES = 50
+
+WEIGHT_COPURCHASE = 3.0
+WEIGHT_CATEGORY = 1.0
+WEIGHT_BRAND = 1.5
+WEIGHT_PRICE = 1.0
+
+
+def copurchase_counts():
+    """Returns {product id: Counter(other product id -> orders containing both)}."""
+    counts = defaultdict(Counter)
+    rows = (
+        OrderItem.objects.exclude(order__status="cancelled")
+        .order_by("order_id")
+        .values_list("order_id", "product_id")
+    )
+
+    def flush(products):
+        if 1 < len(products) <= MAX_ORDER_LINES:
+            for a in products:
+                for b in products:
+                    if a != b:
+                        counts[a][b] += 1
+
+    current, products = None, set()
+    for order_id, product_id in rows.iterator(chunk_size=5000):
+        if order_id != current:
+            flush(products)
+            current, products = order_id, set()
+        products.add(product_id)
+    flush(products)
+    return counts
+
+
+def price_neighbours(group, price):
+    """Ids of up to PRICE_WINDOW products on either side of `price` in a price-sorted group."""
+    prices, ids = group
+    i = bisect_left(prices, price)
+    return ids[max(0, i - PRICE_WINDOW):i + PRICE_WINDOW]
+
+
+def score_candidate(product, other, copurchased):
+    price, other_price = product[3], other[3]
+    proximity = 1 - min(1.0, abs(price - other_price) / max(price, other_price, 1.0))
+    score = WEIGHT_COPURCHASE * math.log1p(copurchased) + WEIGHT_PRICE * proximity
+    if product[1] is not None and product[1] == other[1]:
+        score += WEIGHT_CATEGORY
+    if product[2] and product[2] == other[2]:
+        score += WEIGHT_BRAND
+    return score
+
+
+def compute_related_products(top_k=DEFAULT_TOP_K, chunk_size=500):
+    """Recomputes RelatedProduct for every active product; returns the rows written."""
+    products = {
+        pk: (pk, category_id, (brand or "").strip().lower(), float(price))
+        for pk, category_id, brand, price in Product.objects.filter(is_active=True).values_list(
+            "id", "category_id", "brand", "price"
+        ).iterator(chunk_size=5000)
+    }
+
+    def group_by(position):
+        groups = defaultdict(list)
+        for product in products.values():
+            if product[position]:
+                groups[product[position]].append((product[3], product[0]))
+        return {key: ([p for p, _ in rows], [pk for _, pk in rows]) for key, rows in
+                ((key, sorted(rows)) for key, rows in groups.items())}
+
+    by_category, by_brand = group_by(1), group_by(2)
+    copurchases = copurchase_counts()
+
+    written, batch, chunk_ids = 0, [], []
+    for product in products.values():
+        pk, category_id, brand, price = product
+        partners = copurchases.get(pk, Counter())
+        candidates = set(partners)
+        if category_id in by_category:
+            candidates.update(price_neighbours(by_category[category_id], price))
+        if brand in by_brand:
+            candidates.update(price_neighbours(by_brand[brand], price))
+        candidates.discard(pk)
+
+        scored = sorted(
+            ((score_candidate(product, products[other], partners[other]), other)
+             for other in candidates if other in products),
+            key=lambda item: (-item[0], item[1]),
+        )[:top_k]
+        batch.extend(
+            RelatedProduct(product_id=pk, related_id=other, rank=rank, score=round(score, 4))
+            for rank, (score, other) in enumerate(scored, start=1)
+        )
+        chunk_ids.append(pk)
+        if len(chunk_ids) >= chunk_size:
+            written += _replace(chunk_ids, batch)
+            batch, chunk_ids = [], []
+    written += _replace(chunk_ids, batch)
+
+    # Products that went inactive keep no recommendations of their own.
+    RelatedProduct.objects.exclude(product__is_active=True).delete()
+    transaction.on_commit(bump_catalog_version)
+    return written
+
+
+def _replace(product_ids, rows):
+    if not product_ids:
+        return 0
+    with transaction.atomic():
+        RelatedProduct.objects.filter(product_id__in=product_ids).delete()
+        RelatedProduct.objects.bulk_create(rows)
+    return len(rows)
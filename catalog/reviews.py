@@ -0,0 +1,72 @@
+# catalog/reviews.py
+"""
+Keeps Product.rating_avg, rating_count and the rating_1..rating_5 histogram
+in step with Review rows, so listings can show ratings without aggregating.
+"""
+
+from django.db.models import Case, Count, F, FloatField, Value, When
+from django.db.models.functions import Cast
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+
+from .models import Product, Review
+
+STARS = range(1, 6)
+
+
+def apply_rating_change(product_id, added=None, removed=None):
+    """
+    Applies one review being added, removed or changing rating (both given)
+    to the product's aggregates in a single UPDATE, so concurrent reviews
+    cannot overwrite each other.
+    """
+    deltas = {star: 0 for star in STARS}
+    if added:
+        deltas[added] += 1
+    if removed:
+        deltas[removed] -= 1
+    if not any(deltas.values()):
+        return
+
+    histogram = {star: F(f"rating_{star}") + deltas[star] for star in STARS}
+    count = F("rating_count") + sum(deltas.values())
+    weighted = sum(star * histogram[star] for star in STARS)
+    average = Case(
+        When(GreaterThan(count, 0), then=Cast(weighted, FloatField()) / Cast(count, FloatField())),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+    updates = {f"rating_{star}": histogram[star] for star in STARS if deltas[star]}
+    Product.objects.filter(pk=product_id).update(
+        rating_count=count, rating_avg=average, updated_at=timezone.now(), **updates
+    )
+
+
+def rebuild_rating_stats(chunk_size=1000):
+    """Recomputes every product's aggregates from Review rows; returns products updated."""
+    stats = {}
+    for row in Review.objects.values("product_id", "rating").annotate(n=Count("id")).order_by():
+        stats.setdefault(row["product_id"], {})[row["rating"]] = row["n"]
+
+    batch, updated = [], 0
+    now = timezone.now()
+    # Products that have lost all their reviews are reset along with the rated ones.
+    stale = Product.objects.filter(rating_count__gt=0).values_list("id", flat=True)
+    for product_id in set(stale) | set(stats):
+        histogram = stats.get(product_id, {})
+        count = sum(histogram.values())
+        product = Product(pk=product_id, rating_count=count, updated_at=now)
+        product.rating_avg = sum(star * n for star, n in histogram.items()) / count if count else 0.0
+        for star in STARS:
+            setattr(product, f"rating_{star}", histogram.get(star, 0))
+        batch.append(product)
+        if len(batch) >= chunk_size:
+            updated += _write_stats(batch)
+            batch = []
+    return updated + _write_stats(batch)
+
+
+def _write_stats(products):
+    fields = ["rating_avg", "rating_count", "updated_at"] + [f"rating_{star}" for star in STARS]
+    Product.objects.bulk_update(products, fields)
+    return len(products)
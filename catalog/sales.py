@@ -0,0 +1,79 @@
+# catalog/sales.py
+"""
+Sales-velocity scores behind the "bestsellers" (30-day) and "trending"
+(7-day) listing orderings.
+
+A unit sold at time t is worth exp(-(now - t) / tau) today. Every product's
+score shares the same exp(-now / tau) factor, so we store
+units * exp((t - SCORE_EPOCH) / tau) instead: paid orders only add to the
+column, nothing ever has to be decayed in place, and ordering by the stored
+value is the same as ordering by the decayed one. With tau = 7 days the
+exponent stays within float range for about 13 years after SCORE_EPOCH;
+move the epoch forward and run rebuild_sales_scores well before then.
+"""
+
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Order, OrderItem, Product
+
+SCORE_EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+SCORE_WINDOWS = {
+    "sales_score_7d": 7,
+    "sales_score_30d": 30,
+}
+
+
+def weight_at(moment, days):
+    """Stored weight of one unit sold at `moment` for a score with a `days` time constant."""
+    return math.exp((moment - SCORE_EPOCH).total_seconds() / (days * 86400))
+
+
+def decayed_units(score, days, now=None):
+    """Converts a stored score back into decayed units sold as of `now`."""
+    return score / weight_at(now or timezone.now(), days)
+
+
+def record_order_sales(order_id, paid_at=None):
+    """
+    Adds a newly paid order's units to its products' scores with F()
+    increments (one UPDATE per product), so concurrent payments cannot lose
+    each other's sales. Call it once per order, when it moves to paid.
+    """
+    paid_at = paid_at or timezone.now()
+    weights = {field: weight_at(paid_at, days) for field, days in SCORE_WINDOWS.items()}
+    lines = OrderItem.objects.filter(order_id=order_id).values("product_id").annotate(units=Sum("qty")).order_by()
+    for line in lines:
+        Product.objects.filter(pk=line["product_id"]).update(
+            **{field: F(field) + line["units"] * weight for field, weight in weights.items()}
+        )
+
+
+def rebuild_sales_scores(chunk_size=1000):
+    """Recomputes every product's scores from paid order history; returns products updated."""
+    paid = Order.objects.filter(status__in=("paid", "shipped", "delivered"))
+    rows = (
+        OrderItem.objects.filter(order__in=paid)
+        .values("product_id", "order__created_at")
+        .annotate(units=Sum("qty"))
+        .order_by()
+    )
+    scores = {}
+    for row in rows.iterator(chunk_size=5000):
+        product_scores = scores.setdefault(row["product_id"], dict.fromkeys(SCORE_WINDOWS, 0.0))
+        for field, days in SCORE_WINDOWS.items():
+            product_scores[field] += row["units"] * weight_at(row["order__created_at"], days)
+
+    stale = Product.objects.filter(sales_score_30d__gt=0).values_list("id", flat=True)
+    batch, updated = [], 0
+    for product_id in set(stale) | set(scores):
+        batch.append(Product(pk=product_id, **scores.get(product_id, dict.fromkeys(SCORE_WINDOWS, 0.0))))
+        if len(batch) >= chunk_size:
+            Product.objects.bulk_update(batch, list(SCORE_WINDOWS))
+            updated += len(batch)
+            batch = []
+    Product.objects.bulk_update(batch, list(SCORE_WINDOWS))
+    return updated + len(batch)
@@ -0,0 +1,204 @@
+# catalog/search.py
+"""
+Product search backed by an inverted index stored in ProductSearchTerm.
+
+Title, brand, SKU, category name and description are tokenized into
+weighted terms. A query matches a product when every query token matches
+one of its terms exactly, by prefix or within a small edit distance, and
+results are ranked by the summed weight of the matched terms. Everything is
+plain ORM, so it runs the same on Postgres and on a local SQLite database.
+"""
+
+import re
+
+from django.db.models import Case, Exists, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Length
+
+from .models import Product, ProductSearchTerm
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Relative importance of each product field in the ranking.
+FIELD_WEIGHTS = (
+    ("title", 8),
+    ("sku", 6),
+    ("brand", 5),
+    ("category", 4),
+    ("description", 1),
+)
+
+MAX_TERM_LENGTH = 64
+MAX_DESCRIPTION_TERMS = 200
+MAX_QUERY_TOKENS = 6
+MAX_PREFIX_EXPANSIONS = 50
+# Fuzzy candidates share this many leading letters with the query token.
+FUZZY_PREFIX_LENGTH = 2
+MAX_FUZZY_CANDIDATES = 2000
+
+# Boosts applied to a term's weight depending on how it matched the query token.
+EXACT_BOOST = 3
+PREFIX_BOOST = 2
+FUZZY_BOOST = 1
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return [t[:MAX_TERM_LENGTH] for t in TOKEN_RE.findall(text.lower())]
+
+
+def build_terms(product):
+    """Returns a {term: weight} dict for a product (category must be loaded)."""
+    fields = {
+        "title": product.title,
+        "sku": product.sku,
+        "brand": product.brand,
+        "category": product.category.name if product.category else "",
+        "description": product.description,
+    }
+    terms = {}
+    for field, weight in FIELD_WEIGHTS:
+        tokens = tokenize(fields[field])
+        if field == "description":
+            tokens = list(dict.fromkeys(tokens))[:MAX_DESCRIPTION_TERMS]
+        for token in set(tokens):
+            terms[token] = terms.get(token, 0) + weight
+    return terms
+
+
+def index_products(products):
+    """
+    (Re)writes the index rows of the given products whose terms changed: one
+    read of the current terms, then at most one delete and one insert.
+    """
+    wanted = {product.pk: build_terms(product) for product in products}
+    if not wanted:
+        return
+    current = {}
+    rows = ProductSearchTerm.objects.filter(product__in=list(wanted)).values_list("product_id", "term", "weight")
+    for product_id, term, weight in rows:
+        current.setdefault(product_id, {})[term] = weight
+    changed = [product_id for product_id, terms in wanted.items() if current.get(product_id, {}) != terms]
+    if not changed:
+        return
+    ProductSearchTerm.objects.filter(product__in=changed).delete()
+    ProductSearchTerm.objects.bulk_create(
+        [
+            ProductSearchTerm(product_id=product_id, term=term, weight=weight)
+            for product_id in changed
+            for term, weight in wanted[product_id].items()
+        ],
+        batch_size=1000,
+    )
+
+
+def index_product(product):
+    index_products([product])
+
+
+def rebuild_index(chunk_size=500):
+    """Reindexes the whole catalog in chunks; returns the number of products."""
+    total = 0
+    batch = []
+    for product in Product.objects.select_related("category").iterator(chunk_size=chunk_size):
+        batch.append(product)
+        if len(batch) >= chunk_size:
+            index_products(batch)
+            total += len(batch)
+            batch = []
+    index_products(batch)
+    return total + len(batch)
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance, giving up early once it exceeds `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def allowed_typos(token):
+    if len(token) < 4:
+        return 0
+    return 1 if len(token) < 8 else 2
+
+
+def expand_token(token):
+    """
+    Returns {term: boost} for the index terms that a query token should match:
+    itself, terms it is a prefix of, and (when nothing else matches) terms
+    within a small edit distance that share its first two letters. Typos in
+    the first two letters are not corrected; in exchange the candidates are
+    one narrow index range, so none are lost to the candidate cap.
+    """
+    terms = {token: EXACT_BOOST}
+    prefixed = (
+        ProductSearchTerm.objects.filter(term__startswith=token)
+        .exclude(term=token)
+        .order_by("term")
+        .values_list("term", flat=True)
+        .distinct()[:MAX_PREFIX_EXPANSIONS]
+    )
+    for term in prefixed:
+        terms[term] = PREFIX_BOOST
+
+    typos = allowed_typos(token)
+    if len(terms) == 1 and typos:
+        exists = ProductSearchTerm.objects.filter(term=token).exists()
+        if not exists:
+            candidates = (
+                ProductSearchTerm.objects.annotate(term_length=Length("term"))
+                .filter(
+                    term__startswith=token[:FUZZY_PREFIX_LENGTH],
+                    term_length__gte=len(token) - typos,
+                    term_length__lte=len(token) + typos,
+                )
+                .order_by("term")
+                .values_list("term", flat=True)
+                .distinct()[:MAX_FUZZY_CANDIDATES]
+            )
+            for term in candidates:
+                if edit_distance(token, term, typos) <= typos:
+                    terms[term] = FUZZY_BOOST
+    return terms
+
+
+def search_products(queryset, query):
+    """
+    Filters `queryset` down to products matching every token of `query` and
+    annotates them with `search_rank` (higher is better).
+    """
+    tokens = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TOKENS]
+    if not tokens:
+        return queryset.none()
+
+    rank = Value(0, output_field=IntegerField())
+    for token in tokens:
+        expanded = expand_token(token)
+        by_boost = {}
+        for term, boost in expanded.items():
+            by_boost.setdefault(boost, []).append(term)
+
+        matches = ProductSearchTerm.objects.filter(product=OuterRef("pk"), term__in=list(expanded))
+        score = (
+            matches.annotate(boosted=Case(
+                *[When(term__in=terms, then=F("weight") * boost) for boost, terms in by_boost.items()],
+                default=F("weight"),
+                output_field=IntegerField(),
+            ))
+            .values("product")
+            .annotate(total=Sum("boosted"))
+            .values("total")
+        )
+        queryset = queryset.filter(Exists(matches))
+        rank = rank + Coalesce(Subquery(score, output_field=IntegerField()), 0)
+
+    return queryset.annotate(search_rank=rank)
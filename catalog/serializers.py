@@ -14,12 +14,31 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'slug', 'gst_rate','icon']
         read_only_fields = ['slug']
 
+def build_image_url(request, product_image, variant=None):
+    """
+    Absolute URL for a ProductImage (or None), without touching the database.
+    Uses the requested variant once it has been generated, else the original.
+    """
+    if not (product_image and product_image.image and request):
+        return None
+    path = (product_image.variants or {}).get(variant) if variant else None
+    url = product_image.image.storage.url(path) if path else product_image.image.url
+    return request.build_absolute_uri(url)
+
+
 class ProductImageSerializer(serializers.ModelSerializer):
+    variants = serializers.SerializerMethodField()
+
     class Meta:
         model = ProductImage
-        fields = ["id", "image", "alt"]
+        fields = ["id", "image", "alt", "position", "processing_status", "variants"]
+        read_only_fields = ["processing_status"]
     # ✅ FIXED: The get_image method was redundant as DRF handles this. Removed for simplicity.
 
+    def get_variants(self, obj):
+        request = self.context.get("request")
+        return {name: build_image_url(request, obj, name) for name in (obj.variants or {})}
+
 class ProductListSerializer(serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     thumbnail = serializers.SerializerMethodField()
@@ -29,29 +48,35 @@ class ProductListSerializer(serializers.ModelSerializer):
     is_preorder = serializers.BooleanField(read_only=True)
     preorder_deposit = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
     available_on = serializers.DateField(read_only=True)
+    rating_avg = serializers.DecimalField(max_digits=3, decimal_places=2, read_only=True)
+    # Available to sell: stock not held by pending checkouts.
+    stock = serializers.IntegerField(source="available_stock", read_only=True)
 
     class Meta:
         model = Product
-        fields = ["id", "title", "slug", "price", "mrp", "price_with_gst", "gst_amount", "brand", "stock", "category", "thumbnail", "is_preorder", "preorder_deposit", "available_on"]
+        fields = ["id", "title", "slug", "price", "mrp", "price_with_gst", "gst_amount", "brand", "stock", "category", "thumbnail", "is_preorder", "preorder_deposit", "available_on", "rating_avg", "rating_count"]
 
     def get_thumbnail(self, obj):
-        img = obj.images.first()
-        if img and hasattr(img, 'image') and img.image:
-            request = self.context.get("request")
-            if request:
-                return request.build_absolute_uri(img.image.url)
-        return None
+        # primary_image is select_related by the views, so this costs no query.
+        return build_image_url(self.context.get("request"), obj.primary_image, "card")
 
 class ProductDetailSerializer(serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     images = ProductImageSerializer(many=True, read_only=True)
+    thumbnail = serializers.SerializerMethodField()
     # ✅ FIXED: Removed duplicated fields.
     price_with_gst = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
     gst_amount = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    rating_avg = serializers.DecimalField(max_digits=3, decimal_places=2, read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
+    stock = serializers.IntegerField(source="available_stock", read_only=True)
 
     class Meta:
         model = Product
-        fields = ["id", "title", "slug", "description", "price", "mrp", "price_with_gst", "gst_amount", "brand", "sku", "stock", "category", "images", "is_active", "created_at", "is_preorder", "preorder_deposit", "available_on"]
+        fields = ["id", "title", "slug", "description", "price", "mrp", "price_with_gst", "gst_amount", "brand", "sku", "stock", "category", "thumbnail", "images", "is_active", "created_at", "is_preorder", "preorder_deposit", "available_on", "rating_avg", "rating_count", "rating_histogram"]
+
+    def get_thumbnail(self, obj):
+        return build_image_url(self.context.get("request"), obj.primary_image, "card")
 
 # --- Review Serializer ---
 
@@ -82,12 +107,7 @@ class CartItemSerializer(serializers.ModelSerializer):
         fields = ["id", "product", "product_title", "qty", "price_snapshot", "subtotal", "gst_amount", "total_with_gst", "image", "product_is_preorder"]
 
     def get_image(self, obj):
-        img = obj.product.images.first()
-        if img and hasattr(img, 'image') and img.image:
-            request = self.context.get("request")
-            if request:
-                return request.build_absolute_uri(img.image.url)
-        return None
+        return build_image_url(self.context.get("request"), obj.product.primary_image, "thumb")
 
 class CartSerializer(serializers.ModelSerializer):
     items = CartItemSerializer(many=True, read_only=True)
@@ -102,23 +122,20 @@ class CartSerializer(serializers.ModelSerializer):
     class Meta:
         model = Cart
         fields = ["id", "items", "total", "total_gst", "grand_total", "updated_at", "total_deposit_due", "total_full_price"]
+
+    # Every total comes from Cart.pricing, computed in one pass per cart (see catalog.pricing).
     def get_total_deposit_due(self, obj):
-        # Calculate the sum of required deposits + full price for non-prebook items
-        # This mirrors the logic in Order.calculate_totals
-        # Since this is complex, we assume the backend correctly calculates and returns the current payment total.
-        return sum(
-            (item.product.preorder_deposit * item.qty)
-            if item.product.is_preorder else (item.subtotal + item.gst_amount)
-            for item in obj.items.all()
-        )
+        # Deposits for pre-order items plus the full price of everything else.
+        return obj.pricing.total_deposit_due
+
     def get_total_full_price(self, obj):
-        # Calculate the sum of full prices for all items (for context on the checkout page)
-        return sum(item.total_with_gst for item in obj.items.all())
+        return obj.pricing.total_full_price
+
     def get_total_gst(self, obj):
-        return sum(item.gst_amount for item in obj.items.all())
+        return obj.pricing.total_gst
 
     def get_grand_total(self, obj):
-        return sum(item.total_with_gst for item in obj.items.all())
+        return obj.pricing.grand_total
 
 class AddToCartSerializer(serializers.Serializer):
     # ♻️ REFACTORED: Using PrimaryKeyRelatedField is more robust.
@@ -130,8 +147,9 @@ class AddToCartSerializer(serializers.Serializer):
         qty = data["qty"]
         
         # Check stock only if it's NOT a pre-order
-        if not product.is_preorder and product.stock < qty:
-            raise serializers.ValidationError(f"Insufficient stock for {product.title}. Only {product.stock} left.")
+        if not product.is_preorder and product.available_stock < qty:
+            raise serializers.ValidationError(
+                f"Insufficient stock for {product.title}. Only {product.available_stock} left.")
             
         # Store whether it's a pre-order in validated_data for the view
         data['is_preorder'] = product.is_preorder
@@ -139,6 +157,18 @@ class AddToCartSerializer(serializers.Serializer):
         return data
 
 
+class CartBatchOperationSerializer(serializers.Serializer):
+    OPS = ("add", "set", "remove")
+    op = serializers.ChoiceField(choices=OPS)
+    product = serializers.IntegerField()
+    qty = serializers.IntegerField(min_value=0, required=False)
+
+    def validate(self, data):
+        if data["op"] != "remove" and data.get("qty") is None:
+            raise serializers.ValidationError({"qty": "This field is required."})
+        return data
+
+
 # --- Address Serializer ---
 # ✨ ADDED: Serializer for the new Address model.
 class AddressSerializer(serializers.ModelSerializer):
@@ -208,6 +238,28 @@ class ProductCreateSerializer(serializers.ModelSerializer):
             "available_on"]
         # ♻️ REFACTORED: SKU should be auto-generated, not user-provided.
 
+    def validate_stock(self, value):
+        if self.instance is not None and value < self.instance.reserved:
+            raise serializers.ValidationError(
+                f"Stock cannot go below the {self.instance.reserved} units held by pending checkouts."
+            )
+        return value
+
+class ProductBulkUpdateItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField(required=False)
+    sku = serializers.CharField(required=False, max_length=50)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    mrp = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    stock = serializers.IntegerField(min_value=0, required=False)
+    is_active = serializers.BooleanField(required=False)
+
+    def validate(self, data):
+        if data.get("id") is None and not data.get("sku"):
+            raise serializers.ValidationError("Either id or sku is required.")
+        if not any(field in data for field in ("price", "mrp", "stock", "is_active")):
+            raise serializers.ValidationError("Nothing to update.")
+        return data
+
 class SellerProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
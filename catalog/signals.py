@@ -0,0 +1,121 @@
+# catalog/signals.py
+
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import bump_catalog_version
+from .images import refresh_primary_image, schedule_image_processing
+from .models import Category, PlatformSettings, Product, ProductImage, Review
+from .platform_settings import invalidate_platform_settings
+from .reviews import apply_rating_change
+from .search import index_products
+from .suggest import category_changed, product_changed
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def invalidate_catalog_cache(sender, **kwargs):
+    transaction.on_commit(bump_catalog_version)
+
+
+def reindex_products(products):
+    index_products(products.select_related("category"))
+
+
+# Reindexed after commit from the committed rows, so the save's transaction stays short.
+@receiver(post_save, sender=Product)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(partial(reindex_products, Product.objects.filter(pk=instance.pk)))
+
+
+@receiver(post_save, sender=Category)
+def update_category_search_index(sender, instance, created=False, raw=False, **kwargs):
+    # A renamed category changes the indexed terms of every product in it.
+    if not raw and not created:
+        transaction.on_commit(partial(reindex_products, Product.objects.filter(category_id=instance.pk)))
+
+
+@receiver(post_save, sender=Product)
+def update_suggest_index(sender, instance, raw=False, **kwargs):
+    if not raw:
+        product_changed(instance)
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_suggest_index(sender, instance, **kwargs):
+    product_changed(instance, deleted=True)
+
+
+@receiver(post_save, sender=Category)
+def update_category_suggestions(sender, instance, raw=False, **kwargs):
+    if not raw:
+        category_changed(instance)
+
+
+@receiver(post_delete, sender=Category)
+def remove_category_suggestions(sender, instance, **kwargs):
+    category_changed(instance, deleted=True)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def update_primary_image(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_primary_image(instance.product_id)
+
+
+@receiver(post_save, sender=ProductImage)
+def process_uploaded_image(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        schedule_image_processing(instance.pk)
+
+
+@receiver(post_delete, sender=ProductImage)
+def delete_image_variants(sender, instance, **kwargs):
+    storage = instance.image.storage
+    for path in (instance.variants or {}).values():
+        transaction.on_commit(lambda path=path: storage.delete(path))
+
+
+@receiver(post_save, sender=PlatformSettings)
+@receiver(post_delete, sender=PlatformSettings)
+def invalidate_platform_settings_cache(sender, **kwargs):
+    invalidate_platform_settings()
+    # Again after commit, in case a reader re-cached the old row in the meantime.
+    transaction.on_commit(invalidate_platform_settings)
+
+
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, raw=False, **kwargs):
+    instance._previous_rating = None
+    if instance.pk and not raw:
+        instance._previous_rating = (
+            Review.objects.filter(pk=instance.pk).values_list("rating", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def add_review_to_stats(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        apply_rating_change(instance.product_id, added=instance.rating)
+    elif instance._previous_rating and instance._previous_rating != instance.rating:
+        apply_rating_change(instance.product_id, added=instance.rating, removed=instance._previous_rating)
+    else:
+        return
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_from_stats(sender, instance, **kwargs):
+    apply_rating_change(instance.product_id, removed=instance.rating)
+    transaction.on_commit(bump_catalog_version)
@@ -0,0 +1,316 @@
+# catalog/suggest.py
+"""
+In-process typeahead index over active product titles, brands and category
+names.
+
+Every word start of every suggestion is stored in one sorted list, so a
+prefix lookup is a bisect plus a scan of the matching keys, with no
+database access. Suggestions are weighted by units sold (paid orders) and
+ranked over every match before the limit is applied. Short prefixes match
+most of the index, so their best entries are precomputed at build time and
+kept up to date as entries change; they never scan.
+
+Committed product and category changes are applied in place to this
+process's index and move the suggest version, so every process (this one
+included) rebuilds in the background, at most once per
+SUGGEST_REBUILD_INTERVAL. An index older than SUGGEST_MAX_AGE is rebuilt
+too, to pick up new sales.
+"""
+
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Sum
+
+from .cache import bump_version, get_version
+from .models import Category, OrderItem, Product
+
+SUGGEST_VERSION_KEY = "catalog:suggest-version"
+SUGGEST_REBUILD_INTERVAL = getattr(settings, "SUGGEST_REBUILD_INTERVAL", 60)
+SUGGEST_MAX_AGE = getattr(settings, "SUGGEST_MAX_AGE", 15 * 60)
+MIN_PREFIX_LENGTH = 1
+MAX_WORD_STARTS = 6
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+# Prefixes up to this length keep their best TOP_SIZE entries precomputed. The
+# slack over MAX_LIMIT absorbs removals without a rescan.
+SHORT_PREFIX_LENGTH = 3
+TOP_SIZE = 2 * MAX_LIMIT
+
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text):
+    return _NON_WORD_RE.sub(" ", (text or "").lower()).strip()
+
+
+def word_starts(text):
+    words = normalize(text).split()
+    return [" ".join(words[i:]) for i in range(min(len(words), MAX_WORD_STARTS))]
+
+
+def short_prefixes(text):
+    return {key[:n] for key in word_starts(text) for n in range(1, min(len(key), SHORT_PREFIX_LENGTH) + 1)}
+
+
+class SuggestIndex:
+    def __init__(self, version=None):
+        self.version = version
+        self.lock = threading.RLock()
+        self.keys = []       # sorted (key, entry id)
+        self.entries = {}    # entry id -> {"type", "text", "slug", "weight"}
+        self.products = {}   # product id -> (brand entry id, category entry id, popularity)
+        self.members = {}    # brand/category entry id -> set of product ids
+        # Short prefix -> [best entry ids, best first; whether that is every match].
+        # The list is always the exact top of the matches, only its length varies.
+        self.top = {}
+
+    def _order(self, entry_id):
+        # Most sold first, then shorter and alphabetical completions.
+        entry = self.entries[entry_id]
+        return -entry["weight"], len(entry["text"]), entry["text"]
+
+    # -- building blocks ------------------------------------------------
+    def _offer(self, entry_id):
+        """Slots a new or re-weighted entry into the precomputed tops it belongs to."""
+        for prefix in short_prefixes(self.entries[entry_id]["text"]):
+            top = self.top.get(prefix)
+            if top is None:
+                continue
+            best, complete = top
+            if complete or (best and self._order(entry_id) < self._order(best[-1])):
+                insort(best, entry_id, key=self._order)
+                if len(best) > TOP_SIZE:
+                    best.pop()
+                    top[1] = False
+
+    def _withdraw(self, entry_id):
+        for prefix in short_prefixes(self.entries[entry_id]["text"]):
+            top = self.top.get(prefix)
+            if top is not None and entry_id in top[0]:
+                top[0].remove(entry_id)
+
+    def _add_entry(self, entry_id, kind, text, slug, weight):
+        self.entries[entry_id] = {"type": kind, "text": text, "slug": slug, "weight": weight}
+        for key in word_starts(text):
+            insort(self.keys, (key, entry_id))
+        self._offer(entry_id)
+
+    def _remove_entry(self, entry_id):
+        if entry_id not in self.entries:
+            return
+        self._withdraw(entry_id)
+        entry = self.entries.pop(entry_id)
+        for key in word_starts(entry["text"]):
+            i = bisect_left(self.keys, (key, entry_id))
+            if i < len(self.keys) and self.keys[i] == (key, entry_id):
+                del self.keys[i]
+
+    def _reweigh(self, entry_id, delta):
+        if entry_id not in self.entries or not delta:
+            return
+        self._withdraw(entry_id)
+        self.entries[entry_id]["weight"] += delta
+        self._offer(entry_id)
+
+    def _join_group(self, entry_id, product_id, popularity):
+        self.members.setdefault(entry_id, set()).add(product_id)
+        self._reweigh(entry_id, popularity)
+
+    def _leave_group(self, entry_id, product_id, popularity):
+        members = self.members.get(entry_id)
+        if not members:
+            return
+        members.discard(product_id)
+        self._reweigh(entry_id, -popularity)
+        if not members and entry_id[0] == "brand":
+            # Brands only exist through their products; categories are kept.
+            self._remove_entry(entry_id)
+            del self.members[entry_id]
+
+    # -- public API -----------------------------------------------------
+    def set_category(self, category_id, name, slug):
+        entry_id = ("category", category_id)
+        with self.lock:
+            weight = self.entries[entry_id]["weight"] if entry_id in self.entries else 0
+            self._remove_entry(entry_id)
+            self._add_entry(entry_id, "category", name, slug, weight)
+
+    def remove_category(self, category_id):
+        with self.lock:
+            self._remove_entry(("category", category_id))
+            self.members.pop(("category", category_id), None)
+
+    def set_product(self, product_id, title, slug, brand, category_id, popularity=None):
+        with self.lock:
+            previous = self.products.get(product_id)
+            if popularity is None:
+                popularity = previous[2] if previous else 0
+            self.remove_product(product_id)
+
+            self._add_entry(("product", product_id), "product", title, slug, popularity)
+            brand_id = ("brand", normalize(brand)) if normalize(brand) else None
+            if brand_id:
+                if brand_id not in self.entries:
+                    self._add_entry(brand_id, "brand", brand.strip(), None, 0)
+                self._join_group(brand_id, product_id, popularity)
+            category_entry = ("category", category_id) if category_id else None
+            if category_entry in self.entries:
+                self._join_group(category_entry, product_id, popularity)
+            self.products[product_id] = (brand_id, category_entry, popularity)
+
+    def remove_product(self, product_id):
+        with self.lock:
+            previous = self.products.pop(product_id, None)
+            if previous is None:
+                return
+            brand_id, category_entry, popularity = previous
+            self._remove_entry(("product", product_id))
+            if brand_id:
+                self._leave_group(brand_id, product_id, popularity)
+            if category_entry:
+                self._leave_group(category_entry, product_id, popularity)
+
+    def lookup(self, prefix, limit=DEFAULT_LIMIT):
+        prefix = normalize(prefix)
+        if len(prefix) < MIN_PREFIX_LENGTH:
+            return []
+        with self.lock:
+            entries = self.entries
+            if len(prefix) <= SHORT_PREFIX_LENGTH:
+                best = self._short_top(prefix)
+            else:
+                best = self._rank(prefix, MAX_LIMIT)[0]
+            return [
+                {"type": entries[e]["type"], "text": entries[e]["text"], "slug": entries[e]["slug"]}
+                for e in best[:limit]
+            ]
+
+    def _short_top(self, prefix):
+        top = self.top.get(prefix)
+        # Rescanned only once removals have eaten through the slack.
+        if top is None or (len(top[0]) < MAX_LIMIT and not top[1]):
+            top = self.top[prefix] = list(self._rank(prefix, TOP_SIZE))
+        return top[0]
+
+    def _rank(self, prefix, size):
+        """(best `size` entries over every key starting with `prefix`, whether that is all of them)."""
+        keys = self.keys
+        matched = set()
+        i = bisect_left(keys, (prefix,))
+        while i < len(keys) and keys[i][0].startswith(prefix):
+            matched.add(keys[i][1])
+            i += 1
+        return heapq.nsmallest(size, matched, key=self._order), len(matched) <= size
+
+    def precompute_short_prefixes(self):
+        """Fills the short prefix tops in one pass over the keys."""
+        with self.lock:
+            matches = {}
+            for key, entry_id in self.keys:
+                for n in range(1, min(len(key), SHORT_PREFIX_LENGTH) + 1):
+                    matches.setdefault(key[:n], set()).add(entry_id)
+            self.top = {
+                prefix: [heapq.nsmallest(TOP_SIZE, matched, key=self._order), len(matched) <= TOP_SIZE]
+                for prefix, matched in matches.items()
+            }
+
+
+def get_suggest_version():
+    return get_version(SUGGEST_VERSION_KEY)
+
+
+def build_index():
+    """Builds a fresh index from the database (three queries)."""
+    version = get_suggest_version()
+    index = SuggestIndex(version=version)
+    popularity = dict(
+        OrderItem.objects.filter(order__payment_status="completed").exclude(order__status="cancelled")
+        .values("product_id").annotate(units=Sum("qty")).values_list("product_id", "units")
+    )
+    for category in Category.objects.only("id", "name", "slug"):
+        index.set_category(category.id, category.name, category.slug)
+    products = Product.objects.filter(is_active=True).values_list("id", "title", "slug", "brand", "category_id")
+    for product_id, title, slug, brand, category_id in products.iterator(chunk_size=2000):
+        index.set_product(product_id, title, slug, brand, category_id, popularity.get(product_id, 0))
+    index.precompute_short_prefixes()
+    return index
+
+
+_index = None
+_built_at = 0
+_rebuilding = threading.Lock()
+
+
+def _rebuild_in_background():
+    global _index, _built_at
+    try:
+        _index = build_index()
+        _built_at = time.monotonic()
+    finally:
+        close_old_connections()
+        _rebuilding.release()
+
+
+def get_index():
+    """The process-wide index, built on first use and refreshed when the suggest version moves."""
+    global _index, _built_at
+    if _index is None:
+        with _rebuilding:
+            if _index is None:
+                _index = build_index()
+                _built_at = time.monotonic()
+        return _index
+    age = time.monotonic() - _built_at
+    if (age >= SUGGEST_REBUILD_INTERVAL
+            and (_index.version != get_suggest_version() or age >= SUGGEST_MAX_AGE)
+            and _rebuilding.acquire(blocking=False)):
+        threading.Thread(target=_rebuild_in_background, daemon=True).start()
+    return _index
+
+
+def _after_commit(apply):
+    """Runs `apply` on this process's index (if it has one) and moves the suggest version, after commit."""
+    def run():
+        index = _index
+        if index is not None:
+            apply(index)
+        bump_version(SUGGEST_VERSION_KEY)
+    transaction.on_commit(run)
+
+
+def products_changed(products, deleted=False):
+    """Applies product saves/deletes once the transaction commits; rolled back edits never show."""
+    rows = [
+        (product.pk, product.title, product.slug, product.brand, product.category_id,
+         product.is_active and not deleted)
+        for product in products
+    ]
+
+    def apply(index):
+        for product_id, title, slug, brand, category_id, active in rows:
+            if active:
+                index.set_product(product_id, title, slug, brand, category_id)
+            else:
+                index.remove_product(product_id)
+    _after_commit(apply)
+
+
+def product_changed(product, deleted=False):
+    products_changed([product], deleted)
+
+
+def category_changed(category, deleted=False):
+    category_id, name, slug = category.pk, category.name, category.slug
+
+    def apply(index):
+        if deleted:
+            index.remove_category(category_id)
+        else:
+            index.set_category(category_id, name, slug)
+    _after_commit(apply)
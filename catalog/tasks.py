@@ -0,0 +1,39 @@
+# catalog/tasks.py
+"""Background tasks run by `run_jobs` workers (see catalog.jobs)."""
+
+from django.utils.dateparse import parse_datetime
+
+from accounts.models import Notification
+from .jobs import task
+from .models import Order
+from .sales import record_order_sales
+
+
+@task("catalog.notify_order_placed", queue="notifications")
+def notify_order_placed(order_id):
+    order = Order.objects.filter(pk=order_id).only("id", "user_id", "total").first()
+    if order is None:
+        return
+    Notification.objects.create(
+        user_id=order.user_id,
+        title="Order placed",
+        message=f"Your order #{order.pk} has been placed. Amount due now: ₹{order.total}.",
+    )
+
+
+@task("catalog.notify_payment_result", queue="notifications")
+def notify_payment_result(order_id, succeeded):
+    order = Order.objects.filter(pk=order_id).only("id", "user_id").first()
+    if order is None:
+        return
+    if succeeded:
+        title, message = "Payment received", f"Payment for order #{order.pk} was successful."
+    else:
+        title, message = "Payment failed", f"Payment for order #{order.pk} failed. You can try again from your orders."
+    Notification.objects.create(user_id=order.user_id, title=title, message=message)
+
+
+@task("catalog.record_order_sales")
+def record_order_sales_task(order_id, paid_at):
+    # Runs in the same transaction that marks the job done, so sales are counted once.
+    record_order_sales(order_id, parse_datetime(paid_at))
@@ -1,3 +1,1333 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+import math
+import tempfile
+import threading
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.forms import modelform_factory
+from django.db import IntegrityError, connection, transaction
+from django.db.models import QuerySet
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+
+from accounts.models import Notification, SellerProfile, User
+from . import images, jobs, suggest
+from .bulk import MAX_BULK_UPDATE_ITEMS
+from .cart import MAX_BATCH_OPERATIONS, add_cart_line
+from .idempotency import IDEMPOTENCY_HEADER, claim, idempotent, request_fingerprint
+from .inventory import (
+    STOCK_RESERVATION_TTL, InsufficientStockError, commit_reservations, hold_stock, release_expired_reservations,
+    release_reservations,
+)
+from .models import (
+    Address, Cart, CartItem, Category, IdempotencyKey, Job, Order, OrderItem, PaymentTransaction, PlatformSettings,
+    Product, ProductImage, RelatedProduct, Review, StockReservation,
+)
+from .platform_settings import PLATFORM_SETTINGS_CACHE_KEY, get_platform_settings, invalidate_platform_settings
+from .pricing import price_line, price_order
+from .related import compute_related_products
+from .reviews import rebuild_rating_stats
+from .sales import decayed_units, rebuild_sales_scores, record_order_sales
+from .search import search_products
+from .serializers import ProductSerializer
+
+
+# The threaded tests need several connections writing under row locks, i.e. Postgres,
+# the production database. SQLite serialises writers and fails the concurrent ones
+# with "database is locked"; the non-threaded tests below cover the same guards there.
+NEEDS_POSTGRES = "threaded concurrency tests run on Postgres only"
+
+
+def concurrent_writes_supported():
+    return connection.vendor == "postgresql"
+
+
+def make_user(phone_number, **extra):
+    return User.objects.create_user(
+        phone_number, "pw", name="Test", email=f"{phone_number}@example.com",
+        gender="M", date_of_birth=date(1990, 1, 1), **extra
+    )
+
+
+def make_seller(phone_number):
+    seller = make_user(phone_number)
+    SellerProfile.objects.create(
+        user=seller, shop_name="Shop", pan_no="PAN", bank_account_number="1",
+        bank_name="Bank", ifsc="IFSC", status="approved",
+    )
+    return seller
+
+
+def make_product(seller, title, **extra):
+    fields = {
+        "slug": title.lower().replace(" ", "-"), "sku": title.upper().replace(" ", "-"),
+        "description": "", "price": Decimal("10.00"), "mrp": Decimal("12.00"), "stock": 10,
+    }
+    fields.update(extra)
+    return Product.objects.create(seller=seller, title=title, **fields)
+
+
+def run_concurrently(target, args_list):
+    """Runs target(*args) on one thread per args tuple, released together by a barrier."""
+    barrier = threading.Barrier(len(args_list))
+    errors = []
+
+    def worker(*args):
+        try:
+            barrier.wait()
+            target(*args)
+        except Exception as exc:  # surfaced by the assertion in the test
+            errors.append(exc)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=args) for args in args_list]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+@skipUnless(concurrent_writes_supported(), NEEDS_POSTGRES)
+class ConcurrentCartAddTests(TransactionTestCase):
+    THREADS = 8
+    ADDS_PER_THREAD = 5
+
+    def setUp(self):
+        self.user = make_user("9100000000")
+        seller = make_user("9100000001")
+        category = Category.objects.create(name="Concurrency")
+        self.product = Product.objects.create(
+            seller=seller, category=category, title="Widget", slug="widget", sku="WIDGET-1",
+            description="", price=Decimal("10.00"), mrp=Decimal("12.00"), stock=1000,
+        )
+
+    def add_repeatedly(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        for _ in range(self.ADDS_PER_THREAD):
+            response = client.post("/api/catalog/cart/add/", {"product": self.product.pk, "qty": 1}, format="json")
+            assert response.status_code == 200, response.content
+
+    def test_concurrent_adds_do_not_lose_updates(self):
+        errors = run_concurrently(self.add_repeatedly, [()] * self.THREADS)
+
+        self.assertEqual(errors, [])
+        lines = CartItem.objects.filter(cart__user=self.user, product=self.product)
+        self.assertEqual(lines.count(), 1)
+        self.assertEqual(lines.get().qty, self.THREADS * self.ADDS_PER_THREAD)
+
+
+@skipUnless(concurrent_writes_supported(), NEEDS_POSTGRES)
+class ConcurrentCheckoutTests(TransactionTestCase):
+    BUYERS = 10
+    STOCK = 4
+
+    def setUp(self):
+        PlatformSettings.objects.create()
+        seller = make_user("9200000000")
+        category = Category.objects.create(name="Checkout")
+        self.scarce = Product.objects.create(
+            seller=seller, category=category, title="Scarce", slug="scarce", sku="SCARCE-1",
+            description="", price=Decimal("10.00"), mrp=Decimal("12.00"), stock=self.STOCK,
+        )
+        self.plenty = Product.objects.create(
+            seller=seller, category=category, title="Plenty", slug="plenty", sku="PLENTY-1",
+            description="", price=Decimal("5.00"), mrp=Decimal("6.00"), stock=1000,
+        )
+        self.buyers = []
+        for n in range(self.BUYERS):
+            buyer = make_user(f"92000001{n:02d}")
+            address = Address.objects.create(
+                user=buyer, address_line_1="1 Street", city="City", state="State", pincode="000000"
+            )
+            cart = Cart.objects.create(user=buyer)
+            # Lines in opposite product orders, so unordered locking would deadlock.
+            lines = [(self.scarce, 1), (self.plenty, 2)] if n % 2 else [(self.plenty, 2), (self.scarce, 1)]
+            for product, qty in lines:
+                CartItem.objects.create(cart=cart, product=product, qty=qty, price_snapshot=product.price)
+            self.buyers.append((buyer, address))
+
+    def checkout(self, buyer, address, results):
+        client = APIClient()
+        client.force_authenticate(buyer)
+        response = client.post("/api/catalog/orders/create/", {"address_id": address.pk}, format="json")
+        results.append(response.status_code)
+
+    def test_concurrent_checkouts_never_oversell(self):
+        results = []
+        errors = run_concurrently(self.checkout, [(buyer, address, results) for buyer, address in self.buyers])
+
+        self.assertEqual(errors, [])
+        self.scarce.refresh_from_db()
+        self.plenty.refresh_from_db()
+        placed = results.count(201)
+        self.assertEqual(placed, self.STOCK)
+        self.assertEqual(results.count(400), self.BUYERS - self.STOCK)
+        self.assertEqual(placed, Order.objects.count())
+        # Checkout holds stock; it only leaves `stock` once payment succeeds.
+        self.assertEqual(self.scarce.reserved, placed)
+        self.assertEqual(self.scarce.available_stock, 0)
+        self.assertLessEqual(self.scarce.reserved, self.scarce.stock)
+        self.assertEqual(self.plenty.reserved, 2 * placed)
+        self.assertEqual(StockReservation.objects.filter(status="held").count(), 2 * placed)
+
+
+class ReservationCounterTests(TestCase):
+    def setUp(self):
+        self.seller = make_seller("9300000000")
+        self.product = Product.objects.create(
+            seller=self.seller, title="Held", slug="held", sku="HELD-1",
+            description="", price=Decimal("10.00"), mrp=Decimal("12.00"), stock=5,
+        )
+        self.order = Order.objects.create(user=make_user("9300000001"))
+        hold_stock(self.order, {self.product.pk: 3})
+
+    def test_hold_beyond_available_stock_fails_and_holds_nothing(self):
+        other = Order.objects.create(user=self.order.user)
+        with self.assertRaises(InsufficientStockError) as raised:
+            hold_stock(other, {self.product.pk: 3})
+
+        self.assertEqual(raised.exception.products, [self.product])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 3)
+        self.assertFalse(StockReservation.objects.filter(order=other).exists())
+
+    def test_expired_holds_are_released(self):
+        self.assertEqual(release_expired_reservations(), 0)
+
+        released = release_expired_reservations(now=timezone.now() + timedelta(seconds=STOCK_RESERVATION_TTL + 1))
+
+        self.assertEqual(released, 1)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved), (5, 0))
+        self.assertEqual(StockReservation.objects.get(order=self.order).status, "released")
+
+    def test_full_save_of_stale_instance_keeps_reserved(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        stale.reserved = 0
+        stale.title = "Renamed"
+        stale.save()
+
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.title, self.product.reserved), ("Renamed", 3))
+
+    def test_stock_cannot_drop_below_reserved(self):
+        client = APIClient()
+        client.force_authenticate(self.seller)
+        response = client.patch(f"/api/catalog/seller/products/{self.product.pk}/", {"stock": 2}, format="json")
+        self.assertEqual(response.status_code, 400)
+        response = client.post("/api/catalog/seller/products/bulk-update/",
+                               {"items": [{"id": self.product.pk, "stock": 2}]}, format="json")
+        self.assertEqual(response.json()["updated"], 0)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+
+    def test_only_selling_out_or_restocking_bumps_the_catalog_version(self):
+        other = Order.objects.create(user=self.order.user)
+        with self.captureOnCommitCallbacks() as callbacks:
+            hold_stock(other, {self.product.pk: 1})
+        self.assertEqual(callbacks, [])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            hold_stock(other, {self.product.pk: 1})
+        self.assertEqual(len(callbacks), 1)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            release_reservations(other)
+        self.assertEqual(len(callbacks), 1)
+
+    def test_cached_listing_shows_live_available_stock(self):
+        cache.clear()
+        client = APIClient()
+        self.assertEqual(client.get("/api/catalog/products/").json()["results"][0]["stock"], 2)
+
+        hold_stock(Order.objects.create(user=self.order.user), {self.product.pk: 1})
+
+        self.assertEqual(client.get("/api/catalog/products/").json()["results"][0]["stock"], 1)
+
+    def test_commit_clamps_stock_edited_below_the_hold(self):
+        Product.objects.filter(pk=self.product.pk).update(stock=1)
+
+        commit_reservations(self.order)
+
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved), (0, 0))
+
+
+class CountingView(APIView):
+    """Counts how often the handler really runs; ?fail=1 answers with a 500."""
+    calls = 0
+
+    @idempotent("tests.counting")
+    def post(self, request):
+        CountingView.calls += 1
+        code = 500 if request.query_params.get("fail") else 201
+        return Response({"call": CountingView.calls}, status=code)
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        CountingView.calls = 0
+        self.user = make_user("9400000000")
+        self.factory = APIRequestFactory()
+
+    def post(self, data, key="key-1", path="/counting/"):
+        header = "HTTP_" + IDEMPOTENCY_HEADER.upper().replace("-", "_")
+        request = self.factory.post(path, data, format="json", **{header: key})
+        force_authenticate(request, self.user)
+        return CountingView.as_view()(request)
+
+    def test_retry_replays_the_stored_response(self):
+        first = self.post({"amount": 1})
+        second = self.post({"amount": 1})
+
+        self.assertEqual((first.status_code, second.status_code), (201, 201))
+        self.assertEqual(second.data, {"call": 1})
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(CountingView.calls, 1)
+
+    def test_same_key_with_a_different_request_is_rejected(self):
+        self.post({"amount": 1})
+        response = self.post({"amount": 2})
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(CountingView.calls, 1)
+
+    def test_request_still_in_progress_gets_409_until_its_lease_lapses(self):
+        request = self.factory.post("/counting/", {"amount": 1}, format="json")
+        fingerprint = request_fingerprint(CountingView().initialize_request(request))
+        record = IdempotencyKey.objects.create(
+            user=self.user, scope="tests.counting", key="key-1", fingerprint=fingerprint,
+            expires_at=timezone.now() + timedelta(seconds=30),
+        )
+        self.assertEqual(self.post({"amount": 1}).status_code, 409)
+
+        # The first request's worker died: once the lease lapses the key is claimed again.
+        IdempotencyKey.objects.filter(pk=record.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.post({"amount": 1}).status_code, 201)
+        self.assertEqual(CountingView.calls, 1)
+
+    def test_retry_of_a_slow_request_gets_409_within_the_lease(self):
+        request = self.factory.post("/counting/", {"amount": 1}, format="json")
+        fingerprint = request_fingerprint(CountingView().initialize_request(request))
+        # The first request has been stuck for minutes on lock waits or the payment gateway.
+        started = timezone.now() - timedelta(minutes=5)
+        with mock.patch("catalog.idempotency.timezone.now", return_value=started):
+            claim(self.user, "tests.counting", "key-1", fingerprint)
+
+        self.assertEqual(self.post({"amount": 1}).status_code, 409)
+        self.assertEqual(CountingView.calls, 0)
+
+    def test_server_error_releases_the_key(self):
+        failed = self.post({"amount": 1}, path="/counting/?fail=1")
+        self.assertEqual(failed.status_code, 500)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        retried = self.post({"amount": 1}, path="/counting/?fail=1")
+        self.assertEqual(retried.status_code, 500)
+        self.assertEqual(CountingView.calls, 2)
+
+    def test_claim_retries_when_the_conflicting_key_was_just_released(self):
+        create = IdempotencyKey.objects.create
+        conflicts = []
+
+        def create_after_conflict(**kwargs):
+            # The row we collided with is deleted (a 5xx release) before we can read it.
+            if not conflicts:
+                conflicts.append(kwargs["key"])
+                raise IntegrityError("duplicate key")
+            return create(**kwargs)
+
+        with mock.patch.object(IdempotencyKey.objects, "create", side_effect=create_after_conflict):
+            record, created = claim(self.user, "tests.counting", "key-1", "f" * 64)
+
+        self.assertTrue(created)
+        self.assertEqual((conflicts, record.key), (["key-1"], "key-1"))
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.user = make_user("9500000000")
+        self.runs = []
+        jobs.TASKS["tests.note"] = (self.note, "default", 3)
+        self.addCleanup(jobs.TASKS.pop, "tests.note")
+
+    def note(self, fail=False):
+        self.runs.append(fail)
+        Notification.objects.create(user=self.user, title="Test", message="Test")
+        if fail:
+            raise RuntimeError("boom")
+
+    def make_ready(self, job):
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+
+    def test_jobs_run_in_order_and_only_when_due(self):
+        first = jobs.enqueue("tests.note")
+        later = jobs.enqueue("tests.note", delay=60)
+        second = jobs.enqueue("tests.note")
+
+        self.assertEqual(jobs.claim_next_job("default").pk, first.pk)
+        self.assertEqual(jobs.claim_next_job("default").pk, second.pk)
+        self.assertIsNone(jobs.claim_next_job("default"))
+        self.assertIsNone(jobs.claim_next_job("notifications"))
+        self.assertEqual(Job.objects.get(pk=later.pk).status, "queued")
+
+    def test_success_commits_the_task_and_marks_it_done(self):
+        job = jobs.enqueue("tests.note")
+
+        self.assertEqual(jobs.run_pending("default"), 1)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("done", 1))
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_failures_back_off_then_fail_at_max_attempts(self):
+        job = jobs.enqueue("tests.note", {"fail": True})
+
+        before = timezone.now()
+        with self.assertLogs("catalog.jobs", "ERROR"):
+            jobs.run_pending("default")
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("queued", 1))
+        self.assertGreater(job.run_after, before + timedelta(seconds=jobs.JOB_BACKOFF_BASE * 0.8 - 1))
+        self.assertIn("boom", job.last_error)
+        self.assertEqual(jobs.run_pending("default"), 0)  # not due yet
+
+        for _ in range(2):
+            self.make_ready(job)
+            with self.assertLogs("catalog.jobs", "ERROR"):
+                jobs.run_pending("default")
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, len(self.runs)), ("failed", 3, 3))
+        # Each failed run's writes were rolled back with it.
+        self.assertEqual(Notification.objects.count(), 0)
+
+    def test_backoff_grows_and_is_capped(self):
+        self.assertLess(jobs.backoff(1) * 1.5, jobs.backoff(3))
+        self.assertLessEqual(jobs.backoff(50), jobs.JOB_BACKOFF_MAX * 1.2)
+
+    def test_stale_jobs_are_requeued_until_they_run_out_of_attempts(self):
+        job = jobs.enqueue("tests.note")
+        stale_at = timezone.now() - timedelta(seconds=jobs.JOB_LOCK_TIMEOUT + 1)
+        for attempt in range(1, 4):
+            self.make_ready(job)
+            jobs.claim_next_job("default")
+            Job.objects.filter(pk=job.pk).update(locked_at=stale_at)
+            requeued = jobs.requeue_stale_jobs()
+            job.refresh_from_db()
+            self.assertEqual(job.attempts, attempt)
+            self.assertEqual((requeued, job.status), (1, "queued") if attempt < 3 else (0, "failed"))
+        self.assertEqual(self.runs, [])
+
+    def test_a_run_that_lost_its_job_rolls_back(self):
+        job = jobs.enqueue("tests.note")
+        claimed = jobs.claim_next_job("default", worker="slow")
+        # The slow run was presumed dead, and another worker picked the job up.
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(days=1))
+        jobs.requeue_stale_jobs()
+        self.make_ready(job)
+        retry = jobs.claim_next_job("default", worker="fresh")
+
+        with self.assertLogs("catalog.jobs", "WARNING"):
+            self.assertFalse(jobs.run_job(claimed))
+        self.assertTrue(jobs.run_job(retry))
+
+        self.assertEqual(Notification.objects.count(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), ("done", "fresh"))
+
+
+class ProductListingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = make_user("9600000000")
+        self.client = APIClient()
+
+    def get_all_pages(self, url):
+        ids, pages = [], []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.json())
+            ids.extend(item["id"] for item in pages[-1]["results"])
+            url = pages[-1]["next"]
+        return ids, pages
+
+    def titles(self, url="/api/catalog/products/"):
+        return [item["title"] for item in self.client.get(url).json()["results"]]
+
+    def test_listing_is_cached_until_a_product_is_saved(self):
+        lamp = make_product(self.seller, "Lamp")
+        self.assertEqual(self.titles(), ["Lamp"])
+
+        # Queryset updates send no signals, so the cached page is still served.
+        Product.objects.filter(pk=lamp.pk).update(title="Lantern")
+        self.assertEqual(self.titles(), ["Lamp"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            lamp.title = "Lantern"
+            lamp.save()
+        self.assertEqual(self.titles(), ["Lantern"])
+
+    def add_product_with_images(self, title):
+        product = make_product(self.seller, title)
+        ProductImage.objects.create(product=product, image=f"products/{product.slug}-back.jpg", position=1)
+        ProductImage.objects.create(
+            product=product, image=f"products/{product.slug}-front.jpg", position=0,
+            variants={"card": f"products/variants/{product.slug}-front_card.webp"},
+        )
+        return product
+
+    def test_list_thumbnails_cost_a_fixed_number_of_queries(self):
+        for n in range(2):
+            self.add_product_with_images(f"Vase {n}")
+        with CaptureQueriesContext(connection) as few:
+            self.client.get("/api/catalog/products/")
+
+        for n in range(2, 8):
+            self.add_product_with_images(f"Vase {n}")
+        cache.clear()
+        with self.assertNumQueries(len(few.captured_queries)):
+            results = self.client.get("/api/catalog/products/").json()["results"]
+
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(item["thumbnail"].endswith(f"/{item['slug']}-front_card.webp") for item in results))
+
+    def test_cursor_pages_do_not_shift_when_products_are_inserted(self):
+        products = [make_product(self.seller, f"Item {n}", price=Decimal(f"{n}0.00")) for n in range(1, 6)]
+        first = self.client.get("/api/catalog/products/?pagination=cursor&ordering=price&page_size=2").json()
+        self.assertEqual([item["id"] for item in first["results"]], [products[0].pk, products[1].pk])
+
+        # One product lands before the cursor, one after it.
+        make_product(self.seller, "Cheap", price=Decimal("5.00"))
+        late = make_product(self.seller, "Late", price=Decimal("35.00"))
+        ids, _pages = self.get_all_pages(first["next"])
+
+        self.assertEqual(ids, [products[2].pk, late.pk, products[3].pk, products[4].pk])
+
+    def test_tampered_cursor_is_rejected_with_404(self):
+        make_product(self.seller, "Lamp")
+        make_product(self.seller, "Desk")
+        url = "/api/catalog/products/"
+        params = {"pagination": "cursor", "page_size": 1}
+        cursor = parse_qs(urlsplit(self.client.get(url, params).json()["next"]).query)["cursor"][0]
+        ordering, value, tie = json.loads(base64.urlsafe_b64decode(cursor))
+        tampered = [
+            "not-a-cursor",
+            base64.urlsafe_b64encode(json.dumps(["price", value, tie]).encode()).decode(),
+            base64.urlsafe_b64encode(json.dumps([ordering, value, "1 OR 1=1"]).encode()).decode(),
+        ]
+
+        for cursor in tampered:
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get(url, {**params, "cursor": cursor}).status_code, 404)
+
+    def test_facets_ignore_their_own_selection(self):
+        make_product(self.seller, "Acme Kettle", brand="Acme", price=Decimal("300.00"))
+        make_product(self.seller, "Acme Toaster", brand="Acme", price=Decimal("700.00"))
+        make_product(self.seller, "Acme Mixer", brand="Acme", price=Decimal("800.00"), stock=0)
+        make_product(self.seller, "Bolt Kettle", brand="Bolt", price=Decimal("400.00"))
+        make_product(self.seller, "Bolt Mixer", brand="Bolt", price=Decimal("900.00"), stock=0)
+        make_product(self.seller, "Core Kettle", brand="Core", price=Decimal("200.00"))
+
+        facets = self.client.get("/api/catalog/products/facets/", {"brand": "Acme", "in_stock": "true"}).json()
+
+        self.assertEqual(facets["total"], 2)
+        # Brands are counted over in-stock products only, with Acme's siblings still listed.
+        self.assertEqual(facets["brand"], [
+            {"value": "Acme", "count": 2}, {"value": "Bolt", "count": 1}, {"value": "Core", "count": 1},
+        ])
+        # Stock is counted over Acme only, including the out-of-stock row the filter hides.
+        self.assertEqual(facets["in_stock"], {"true": 2, "false": 1})
+        # Unselected facets honour every selection.
+        self.assertEqual(facets["price_range"], [{"value": "0-500", "count": 1}, {"value": "500-1000", "count": 1}])
+
+        two_brands = self.client.get("/api/catalog/products/facets/", {"brand": "Acme,Bolt"}).json()
+        self.assertEqual(two_brands["total"], 5)
+        self.assertEqual(two_brands["in_stock"], {"true": 3, "false": 2})
+
+    def test_search_with_cursor_pagination_keeps_relevance_order(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            in_title = [make_product(self.seller, f"Desk Lamp {n}") for n in range(4)]
+            in_description = [
+                make_product(self.seller, f"Shade {n}", description="fits any lamp") for n in range(4)
+            ]
+
+        ids, pages = self.get_all_pages("/api/catalog/products/?search=lamp&pagination=cursor&page_size=3")
+
+        # Title matches outrank description matches, even though they are older.
+        self.assertEqual(ids, [p.pk for p in reversed(in_title)] + [p.pk for p in reversed(in_description)])
+        self.assertEqual(len(pages), 3)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Lighting")
+        self.product = make_product(make_user("9610000000"), "Lamp", category=self.category)
+        self.client = APIClient()
+
+    def assert_revalidates_until_edited(self, url, edit):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn("Last-Modified", first.headers)
+
+        unchanged = self.client.get(url, HTTP_IF_NONE_MATCH=first.headers["ETag"])
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(unchanged.headers["ETag"], first.headers["ETag"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            edit()
+        edited = self.client.get(url, HTTP_IF_NONE_MATCH=first.headers["ETag"])
+        self.assertEqual(edited.status_code, 200)
+        self.assertNotEqual(edited.headers["ETag"], first.headers["ETag"])
+
+    def test_product_detail_is_304_until_the_product_changes(self):
+        def edit():
+            self.product.price = Decimal("12.00")
+            self.product.save()
+
+        self.assert_revalidates_until_edited(f"/api/catalog/products/{self.product.slug}/", edit)
+
+    def test_product_detail_changes_with_its_category(self):
+        def edit():
+            self.category.name = "Lights"
+            self.category.save()
+
+        self.assert_revalidates_until_edited(f"/api/catalog/products/{self.product.slug}/", edit)
+
+    def test_category_list_is_304_until_a_category_is_added(self):
+        self.assert_revalidates_until_edited(
+            "/api/catalog/categories/", lambda: Category.objects.create(name="Furniture")
+        )
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.product = make_product(make_user("9620000000"), "Poster")
+
+    def upload(self, name="poster.jpg"):
+        # A landscape photo whose EXIF says "rotate 90°" and carries a camera tag.
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation
+        exif[0x010F] = "Camera Co"  # Make
+        buffer = io.BytesIO()
+        Image.new("RGB", (800, 400), "red").save(buffer, "JPEG", exif=exif)
+        return ProductImage.objects.create(product=self.product, image=SimpleUploadedFile(name, buffer.getvalue()))
+
+    def test_variants_are_upright_webp_without_exif(self):
+        product_image = self.upload()
+
+        images.process_image(product_image.pk)
+
+        product_image.refresh_from_db()
+        self.assertEqual(product_image.processing_status, "ready")
+        self.assertEqual(set(product_image.variants), set(images.IMAGE_VARIANTS))
+        for name, max_edge in images.IMAGE_VARIANTS.items():
+            with self.subTest(variant=name), product_image.image.storage.open(product_image.variants[name]) as f:
+                with Image.open(f) as variant:
+                    self.assertEqual(variant.format, "WEBP")
+                    self.assertEqual(len(variant.getexif()), 0)
+                    self.assertNotIn("exif", variant.info)
+                    # Rotated into portrait, and never upscaled past the original.
+                    self.assertEqual(variant.size, (min(max_edge, 800) // 2, min(max_edge, 800)))
+
+    def test_unreadable_upload_is_marked_failed(self):
+        product_image = ProductImage.objects.create(
+            product=self.product, image=SimpleUploadedFile("broken.jpg", b"not an image")
+        )
+
+        with self.assertLogs("catalog.images", "ERROR"):
+            images.process_image(product_image.pk)
+
+        product_image.refresh_from_db()
+        self.assertEqual((product_image.processing_status, product_image.variants), ("failed", {}))
+
+
+class ProductImportTests(TestCase):
+    def setUp(self):
+        self.seller = make_seller("9630000000")
+        Category.objects.create(name="Kitchen", slug="kitchen")
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+
+    def import_file(self, name, content):
+        upload = SimpleUploadedFile(name, content.encode("utf-8"))
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post("/api/catalog/seller/products/import/", {"file": upload}, format="multipart")
+
+    def test_bad_rows_are_reported_and_the_rest_imported(self):
+        response = self.import_file("products.csv", (
+            "title,description,price,mrp,stock,category\n"
+            "Kettle,Steel,20.00,25.00,5,kitchen\n"
+            "Toaster,Two slots,cheap,25.00,5,kitchen\n"
+            "Mixer,,30.00,35.00,5,garden\n"
+            "Pan,Cast iron,15.00,18.00,3,\n"
+        ))
+
+        self.assertEqual(response.status_code, 201)
+        report = response.json()
+        self.assertEqual((report["created"], report["error_count"], report["file_error"]), (2, 2, None))
+        self.assertEqual([error["row"] for error in report["errors"]], [3, 4])
+        self.assertIn("price", report["errors"][0]["errors"])
+        self.assertIn("category", report["errors"][1]["errors"])
+        kettle = Product.objects.get(title="Kettle")
+        self.assertEqual((kettle.seller, kettle.category.slug), (self.seller, "kitchen"))
+        self.assertEqual(search_products(Product.objects.all(), "kettle").get(), kettle)
+
+    def test_unparseable_jsonl_lines_are_row_errors(self):
+        response = self.import_file("products.jsonl", (
+            '{"title": "Kettle", "description": "Steel", "price": "20.00", "mrp": "25.00", "stock": 5}\n'
+            "{not json\n"
+            '["a list"]\n'
+        ))
+
+        report = response.json()
+        self.assertEqual((report["created"], report["error_count"]), (1, 2))
+        self.assertEqual([error["row"] for error in report["errors"]], [2, 3])
+
+    def test_sku_collision_retries_the_batch_row_by_row(self):
+        make_product(self.seller, "Existing", sku="SKU-TAKEN")
+        skus = ["SKU-TAKEN", "SKU-FREE-1", "SKU-FREE-2"]
+
+        with mock.patch("catalog.importer.generate_product_sku", side_effect=skus):
+            response = self.import_file("products.csv", (
+                "title,description,price,mrp,stock\n"
+                "Kettle,Steel,20.00,25.00,5\n"
+                "Toaster,Two slots,30.00,35.00,5\n"
+            ))
+
+        self.assertEqual(response.json()["created"], 2)
+        self.assertEqual(
+            dict(Product.objects.filter(title__in=["Kettle", "Toaster"]).values_list("title", "sku")),
+            {"Kettle": "SKU-FREE-2", "Toaster": "SKU-FREE-1"},
+        )
+
+    def test_a_row_that_keeps_colliding_is_reported(self):
+        make_product(self.seller, "Existing", sku="SKU-TAKEN")
+
+        with mock.patch("catalog.importer.generate_product_sku", return_value="SKU-TAKEN"):
+            response = self.import_file("products.csv", (
+                "title,description,price,mrp,stock\n"
+                "Kettle,Steel,20.00,25.00,5\n"
+            ))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["errors"][0]["row"], 2)
+        self.assertFalse(Product.objects.filter(title="Kettle").exists())
+
+
+class ProductExportTests(TestCase):
+    def setUp(self):
+        self.seller = make_seller("9640000000")
+        category = Category.objects.create(name="Kitchen", slug="kitchen")
+        self.kettle = make_product(self.seller, "Kettle, Steel", category=category, brand="Acme",
+                                   price=Decimal("20.00"), mrp=Decimal("25.00"))
+        self.pan = make_product(self.seller, "Pan", is_active=False)
+        self.other = make_product(make_seller("9640000001"), "Other")
+        self.client = APIClient()
+
+    def export(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode("utf-8")
+
+    def test_seller_csv_export_lists_only_their_products(self):
+        self.client.force_authenticate(self.seller)
+
+        rows = list(csv.DictReader(io.StringIO(self.export("/api/catalog/seller/products/export/"))))
+
+        self.assertEqual([row["id"] for row in rows], [str(self.kettle.pk), str(self.pan.pk)])
+        self.assertEqual(
+            {column: rows[0][column] for column in ("title", "category", "brand", "price", "is_active")},
+            {"title": "Kettle, Steel", "category": "kitchen", "brand": "Acme", "price": "20.00", "is_active": "True"},
+        )
+        self.assertEqual(rows[0]["price_with_gst"], str(self.kettle.price_with_gst.quantize(Decimal("0.01"))))
+
+    def test_seller_jsonl_export_is_one_object_per_line(self):
+        self.client.force_authenticate(self.seller)
+
+        content = self.export("/api/catalog/seller/products/export/", file_format="jsonl")
+
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(
+            [(row["sku"], row["is_active"]) for row in rows], [(self.kettle.sku, True), (self.pan.sku, False)]
+        )
+
+    def test_admin_export_filters_by_seller_and_status(self):
+        self.client.force_authenticate(make_user("9640000002", is_staff=True))
+
+        content = self.export("/api/catalog/admin/products/export/", file_format="jsonl",
+                              seller=self.seller.pk, is_active="true")
+
+        self.assertEqual([json.loads(line)["id"] for line in content.splitlines()], [self.kettle.pk])
+
+    def test_bad_parameters_are_rejected_with_400(self):
+        self.client.force_authenticate(make_user("9640000002", is_staff=True))
+        for url, params in [
+            ("/api/catalog/admin/products/export/", {"seller": "abc"}),
+            ("/api/catalog/admin/products/export/", {"seller": "١٢"}),
+            ("/api/catalog/admin/products/export/", {"file_format": "xml"}),
+        ]:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
+
+        self.client.force_authenticate(self.seller)
+        response = self.client.get("/api/catalog/seller/products/export/", {"file_format": "xml"})
+        self.assertEqual(response.status_code, 400)
+
+
+class RelatedProductTests(TestCase):
+    def setUp(self):
+        seller = make_user("9650000000")
+        kitchen = Category.objects.create(name="Kitchen")
+        lighting = Category.objects.create(name="Lighting")
+        self.kettle = make_product(seller, "Kettle", category=kitchen, brand="Acme", price=Decimal("20.00"))
+        self.toaster = make_product(seller, "Toaster", category=kitchen, brand="acme ", price=Decimal("22.00"))
+        self.pan = make_product(seller, "Pan", category=kitchen, brand="Bolt", price=Decimal("200.00"))
+        self.mug = make_product(seller, "Mug", category=lighting, price=Decimal("5.00"))
+        self.lamp = make_product(seller, "Lamp", category=lighting, price=Decimal("20.00"))
+        self.buyer = make_user("9650000001")
+
+    def order(self, *products, status="pending"):
+        order = Order.objects.create(user=self.buyer, status=status)
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, title_snapshot=product.title,
+                                     price_snapshot=product.price, qty=1)
+
+    def related_titles(self, product):
+        response = APIClient().get(f"/api/catalog/products/{product.slug}/related/")
+        self.assertEqual(response.status_code, 200)
+        return [item["title"] for item in response.json()]
+
+    def test_copurchases_outweigh_category_brand_and_price(self):
+        self.order(self.kettle, self.mug)
+        self.order(self.kettle, self.mug)
+        # Cancelled orders say nothing about what goes together.
+        self.order(self.kettle, self.lamp, status="cancelled")
+
+        compute_related_products()
+
+        self.assertEqual(self.related_titles(self.kettle), ["Mug", "Toaster", "Pan"])
+        self.assertEqual(self.related_titles(self.lamp), ["Mug"])
+
+    def test_only_the_top_k_are_kept_and_inactive_products_are_hidden(self):
+        compute_related_products(top_k=1)
+        self.assertEqual(self.related_titles(self.kettle), ["Toaster"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.toaster.is_active = False
+            self.toaster.save()
+        self.assertEqual(self.related_titles(self.kettle), [])
+
+        compute_related_products(top_k=1)
+        self.assertEqual(self.related_titles(self.kettle), ["Pan"])
+        self.assertFalse(RelatedProduct.objects.filter(product=self.toaster).exists())
+
+
+class SalesScoreTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        seller = make_user("9660000000")
+        self.steady = make_product(seller, "Steady")
+        self.fresh = make_product(seller, "Fresh")
+        self.buyer = make_user("9660000001")
+        self.now = timezone.now()
+
+    def paid_order(self, product, qty, paid_at, status="paid"):
+        order = Order.objects.create(user=self.buyer, status=status)
+        Order.objects.filter(pk=order.pk).update(created_at=paid_at)
+        OrderItem.objects.create(order=order, product=product, title_snapshot=product.title,
+                                 price_snapshot=product.price, qty=qty)
+        return order
+
+    def test_scores_decay_with_each_window(self):
+        order = self.paid_order(self.steady, 2, self.now)
+        record_order_sales(order.pk, paid_at=self.now)
+        self.steady.refresh_from_db()
+
+        week_later = self.now + timedelta(days=7)
+        self.assertAlmostEqual(decayed_units(self.steady.sales_score_7d, 7, now=self.now), 2)
+        self.assertAlmostEqual(decayed_units(self.steady.sales_score_7d, 7, now=week_later), 2 / math.e)
+        self.assertAlmostEqual(decayed_units(self.steady.sales_score_30d, 30, now=week_later), 2 * math.exp(-7 / 30))
+
+    def test_trending_favours_recent_sales_and_bestsellers_volume(self):
+        # Two units a fortnight ago against one today.
+        record_order_sales(self.paid_order(self.steady, 2, self.now - timedelta(days=14)).pk,
+                           paid_at=self.now - timedelta(days=14))
+        record_order_sales(self.paid_order(self.fresh, 1, self.now).pk, paid_at=self.now)
+
+        def titles(ordering):
+            response = APIClient().get("/api/catalog/products/", {"ordering": ordering})
+            return [item["title"] for item in response.json()["results"]]
+
+        self.assertEqual(titles("trending"), ["Fresh", "Steady"])
+        self.assertEqual(titles("bestsellers"), ["Steady", "Fresh"])
+
+    def test_rebuild_matches_the_incremental_scores(self):
+        for product, qty, days_ago in [(self.steady, 2, 14), (self.fresh, 1, 0), (self.steady, 3, 2)]:
+            paid_at = self.now - timedelta(days=days_ago)
+            record_order_sales(self.paid_order(product, qty, paid_at).pk, paid_at=paid_at)
+        self.paid_order(self.fresh, 5, self.now, status="cancelled")
+        incremental = dict(Product.objects.values_list("id", "sales_score_7d"))
+
+        Product.objects.update(sales_score_7d=0, sales_score_30d=0)
+        rebuild_sales_scores()
+
+        for product_id, score in Product.objects.values_list("id", "sales_score_7d"):
+            self.assertAlmostEqual(score / incremental[product_id], 1)
+
+    def test_successful_payment_queues_the_sales_update_once(self):
+        order = self.paid_order(self.fresh, 2, self.now, status="pending")
+        PaymentTransaction.objects.create(order=order, transaction_id="TXN-1", payment_gateway="razorpay",
+                                          amount=Decimal("20.00"))
+
+        for _ in range(2):  # the gateway retries its callback
+            response = APIClient().post("/api/catalog/payment/callback/razorpay/",
+                                        {"transaction_id": "TXN-1", "status": "success"}, format="json")
+            self.assertEqual(response.status_code, 200)
+
+        sales_jobs = Job.objects.filter(task="catalog.record_order_sales")
+        self.assertEqual(sales_jobs.count(), 1)
+        self.assertTrue(jobs.run_job(jobs.claim_next_job("default")))
+        self.fresh.refresh_from_db()
+        self.assertAlmostEqual(decayed_units(self.fresh.sales_score_7d, 7), 2, places=3)
+
+    def test_failed_payment_records_no_sales(self):
+        order = self.paid_order(self.fresh, 2, self.now, status="pending")
+        PaymentTransaction.objects.create(order=order, transaction_id="TXN-2", payment_gateway="razorpay",
+                                          amount=Decimal("20.00"))
+
+        response = APIClient().post("/api/catalog/payment/callback/razorpay/",
+                                    {"transaction_id": "TXN-2", "status": "failed"}, format="json")
+
+        self.assertEqual(response.json()["status"], "failed")
+        self.assertFalse(Job.objects.filter(task="catalog.record_order_sales").exists())
+
+
+class GuestCartTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        seller = make_user("9700000000")
+        category = Category.objects.create(name="Guest", gst_rate=Decimal("18.00"))
+        self.product = make_product(seller, "Kettle", category=category, price=Decimal("49.99"))
+        self.user = make_user("9700000001")
+        self.client = APIClient()
+
+    def add_as_guest(self, qty):
+        response = self.client.post("/api/catalog/cart/guest/", [{"op": "add", "product": self.product.pk, "qty": qty}],
+                                    format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def user_cart(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        return client.get("/api/catalog/cart/").json()
+
+    def test_guest_cart_has_the_user_cart_shape_and_merges_on_login(self):
+        guest = self.add_as_guest(2)
+        token = guest.pop("token")
+        self.assertEqual(self.client.get("/api/catalog/cart/guest/", HTTP_X_GUEST_CART=token).json()["items"],
+                         guest["items"])
+
+        response = self.client.post("/api/accounts/login/", {"phone_number": self.user.phone_number, "password": "pw"},
+                                    format="json", HTTP_X_GUEST_CART=token)
+        self.assertEqual(response.json()["guest_cart_merged"], 1)
+
+        user = self.user_cart()
+        self.assertEqual(user["items"][0]["qty"], 2)
+        # Same keys and JSON types before and after login; only the ids and timestamp differ.
+        for name in ("id", "updated_at"):
+            guest.pop(name), user.pop(name)
+        guest_item, user_item = guest.pop("items")[0], user.pop("items")[0]
+        guest_item.pop("id"), user_item.pop("id")
+        self.assertEqual(guest, user)
+        self.assertEqual(guest_item, user_item)
+        self.assertEqual(user["total"], "99.98")
+
+    def test_otp_login_merges_the_guest_cart(self):
+        token = self.add_as_guest(1)["token"]
+        self.user.otp, self.user.otp_created_at = "123456", timezone.now()
+        self.user.save()
+
+        response = self.client.post("/api/accounts/otp/verify/",
+                                    {"phone_number": self.user.phone_number, "otp": "123456", "guest_cart_token": token},
+                                    format="json")
+
+        self.assertEqual(response.json()["guest_cart_merged"], 1)
+        self.assertEqual(self.user_cart()["items"][0]["qty"], 1)
+
+
+class BulkUpdateTests(TestCase):
+    def setUp(self):
+        self.seller = make_seller("9800000000")
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+        self.lamp = make_product(self.seller, "Brass Lamp", stock=4)
+        self.addCleanup(setattr, suggest, "_index", None)
+        suggest._index = suggest.build_index()
+
+    def bulk_update(self, items):
+        return self.client.post("/api/catalog/seller/products/bulk-update/", {"items": items}, format="json")
+
+    def test_deactivating_updates_the_suggest_index_after_commit(self):
+        self.assertEqual(len(suggest._index.lookup("brass")), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.bulk_update([{"sku": self.lamp.sku, "is_active": False, "price": "9.00"}])
+
+        self.assertEqual(response.json(), {"updated": 1, "errors": []})
+        self.assertEqual(suggest._index.lookup("brass"), [])
+        self.lamp.refresh_from_db()
+        self.assertEqual((self.lamp.is_active, self.lamp.price, self.lamp.stock), (False, Decimal("9.00"), 4))
+
+    def test_rows_without_a_stock_change_keep_the_current_stock(self):
+        other = make_product(self.seller, "Iron Lamp", stock=7)
+        # Sold after the request read the rows: a stale copy must not be written back.
+        Product.objects.filter(pk=self.lamp.pk).update(stock=1)
+        with mock.patch("catalog.bulk._load_seller_products") as load:
+            stale = Product.objects.filter(pk__in=[self.lamp.pk, other.pk]).in_bulk()
+            stale[self.lamp.pk].stock = 4
+            load.return_value = (stale, {})
+            response = self.bulk_update([{"id": self.lamp.pk, "price": "5.00"}, {"id": other.pk, "stock": 9}])
+
+        self.assertEqual(response.json()["updated"], 2)
+        self.lamp.refresh_from_db()
+        self.assertEqual(self.lamp.stock, 1)
+
+    def test_item_count_is_capped(self):
+        response = self.bulk_update([{"id": self.lamp.pk, "stock": 1}] * (MAX_BULK_UPDATE_ITEMS + 1))
+
+        self.assertEqual(response.status_code, 400)
+        self.lamp.refresh_from_db()
+        self.assertEqual(self.lamp.stock, 4)
+
+
+class SuggestTests(TestCase):
+    def setUp(self):
+        self.seller = make_user("9810000000")
+        self.buyer = make_user("9810000001")
+        self.addCleanup(setattr, suggest, "_index", None)
+
+    def sell(self, product, qty, payment_status="completed"):
+        order = Order.objects.create(user=self.buyer, payment_status=payment_status)
+        OrderItem.objects.create(order=order, product=product, title_snapshot=product.title,
+                                 price_snapshot=product.price, qty=qty)
+
+    def titles(self, prefix):
+        return [item["text"] for item in suggest._index.lookup(prefix, suggest.MAX_LIMIT)]
+
+    def test_only_paid_orders_count_towards_popularity(self):
+        kettle = make_product(self.seller, "Kettle")
+        kit = make_product(self.seller, "Kitchen Kit")
+        self.sell(kettle, 1)
+        self.sell(kit, 50, payment_status="pending")
+        suggest._index = suggest.build_index()
+
+        self.assertEqual(self.titles("k"), ["Kettle", "Kitchen Kit"])
+
+    def test_short_prefix_tops_stay_exact_as_entries_change(self):
+        products = [make_product(self.seller, f"Bottle {n}", brand=f"Brand {n % 3}") for n in range(60)]
+        for n, product in enumerate(products[:30]):
+            self.sell(product, n + 1)
+        suggest._index = index = suggest.build_index()
+
+        def brute_force(prefix):
+            return [index.entries[e]["text"] for e in index._rank(prefix, suggest.MAX_LIMIT)[0]]
+
+        for n, product in enumerate(products[::7] + products[-2:]):
+            with self.captureOnCommitCallbacks(execute=True):
+                if product.pk in (products[-1].pk, products[-2].pk):
+                    product.delete()
+                elif n % 3 == 0:
+                    product.is_active = False
+                    product.save()
+                else:
+                    product.title = f"Bucket {n}"
+                    product.brand = "Brand 9"
+                    product.save()
+            for prefix in ("b", "bo", "br", "bu", "bra"):
+                self.assertEqual(self.titles(prefix), brute_force(prefix), prefix)
+
+    def test_rolled_back_edits_do_not_reach_the_index(self):
+        lamp = make_product(self.seller, "Lamp")
+        suggest._index = suggest.build_index()
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    lamp.title = "Lantern"
+                    lamp.save()
+                    raise RuntimeError("rolled back")
+            except RuntimeError:
+                pass
+
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.titles("la"), ["Lamp"])
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.seller = make_user("9820000000")
+
+    def search(self, query):
+        queryset = search_products(Product.objects.filter(is_active=True), query).order_by("-search_rank", "-id")
+        return [product.title for product in queryset]
+
+    def create(self, title, **extra):
+        with self.captureOnCommitCallbacks(execute=True):
+            return make_product(self.seller, title, **extra)
+
+    def test_exact_matches_outrank_prefix_matches(self):
+        self.create("Lampshade")
+        self.create("Lamp")
+        self.create("Floor Light", description="a lamp for any room")
+
+        self.assertEqual(self.search("lamp"), ["Lamp", "Lampshade", "Floor Light"])
+        self.assertEqual(self.search("lamps"), ["Lampshade"])
+
+    def test_typos_match_within_the_allowed_distance(self):
+        self.create("Lamp")
+        self.create("Lampshade")
+
+        self.assertEqual(self.search("lanp"), ["Lamp"])
+        self.assertEqual(self.search("lampshsde"), ["Lampshade"])
+        self.assertEqual(self.search("lxnp"), [])
+
+    def test_typo_candidates_are_not_lost_to_alphabetically_earlier_terms(self):
+        # More terms starting with "t" that sort before "tiger" than the candidate cap.
+        for n in range(11):
+            self.create(f"Filler {n}", description=" ".join(f"t{n:02d}{i:03d}" for i in range(200)))
+        self.create("Tiger")
+
+        self.assertEqual(self.search("tigor"), ["Tiger"])
+
+    def test_edits_are_indexed_after_commit(self):
+        lamp = self.create("Lamp")
+        with self.captureOnCommitCallbacks() as callbacks:
+            lamp.title = "Lantern"
+            lamp.save()
+        self.assertEqual(self.search("lantern"), [])
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.search("lantern"), ["Lantern"])
+
+
+class PricingTests(TestCase):
+    def test_price_order_splits_preorder_deposits_from_the_remaining_due(self):
+        lines = [
+            price_line(2, Decimal("100.00"), Decimal("18.00")),
+            price_line(1, Decimal("500.00"), Decimal("5.00"), is_preorder=True, deposit=Decimal("50.00")),
+        ]
+
+        totals = price_order(lines, Decimal("10.00"), discount=Decimal("20.00"))
+
+        self.assertEqual(totals.subtotal, Decimal("700.00"))
+        self.assertEqual(totals.gst_amount, Decimal("61.00"))
+        self.assertTrue(totals.is_preorder_order)
+        # Regular lines in full (236) plus the preorder deposit (50), less the voucher.
+        self.assertEqual(totals.deposit_amount, Decimal("266.00"))
+        self.assertEqual(totals.total, totals.deposit_amount)
+        self.assertEqual(totals.remaining_due, Decimal("495.00"))
+        self.assertEqual(totals.commission, Decimal("70.00"))
+
+    def test_calculate_totals_keeps_the_instance_equal_to_the_stored_row(self):
+        seller, buyer = make_user("9830000000"), make_user("9830000001")
+        category = Category.objects.create(name="Odd Prices", gst_rate=Decimal("18.00"))
+        product = make_product(seller, "Odd Kettle", category=category, price=Decimal("49.99"))
+        order = Order.objects.create(user=buyer)
+        OrderItem.objects.create(order=order, product=product, title_snapshot=product.title,
+                                 price_snapshot=product.price, qty=3)
+
+        order.calculate_totals(Decimal("7.50"))
+
+        stored = Order.objects.get(pk=order.pk)
+        for field in ("subtotal", "gst_amount", "deposit_amount", "remaining_due", "commission", "total"):
+            self.assertEqual(getattr(order, field), getattr(stored, field), field)
+        self.assertEqual((order.gst_amount, order.commission, order.total),
+                         (Decimal("26.99"), Decimal("11.25"), Decimal("176.96")))
+
+
+class PlatformSettingsCacheTests(TestCase):
+    def setUp(self):
+        invalidate_platform_settings()
+        self.addCleanup(invalidate_platform_settings)
+
+    def set_commission(self, rate):
+        row = PlatformSettings.objects.get(pk=1)
+        row.platform_commission_rate = rate
+        row.save()
+
+    def test_settings_are_read_once_until_saved(self):
+        self.assertEqual(get_platform_settings().platform_commission_rate, Decimal("5.00"))
+        with self.assertNumQueries(0):
+            get_platform_settings()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.set_commission(Decimal("7.50"))
+
+        self.assertEqual(get_platform_settings().platform_commission_rate, Decimal("7.50"))
+
+    def test_a_stale_copy_cached_before_commit_is_dropped_after_it(self):
+        stale = get_platform_settings()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.set_commission(Decimal("7.50"))
+            # Another reader re-caches the committed (old) row before this transaction commits.
+            cache.set(PLATFORM_SETTINGS_CACHE_KEY, stale)
+
+        self.assertEqual(get_platform_settings().platform_commission_rate, Decimal("7.50"))
+
+
+class ReviewStatsTests(TestCase):
+    def setUp(self):
+        self.product = make_product(make_user("9840000000"), "Rated")
+        self.reviewers = [make_user(f"98400001{n:02d}") for n in range(3)]
+
+    def assertStats(self, count, average, histogram):
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_count, count)
+        self.assertAlmostEqual(self.product.rating_avg, average)
+        self.assertEqual(self.product.rating_histogram, {str(star): histogram.get(star, 0) for star in range(1, 6)})
+
+    def test_create_edit_and_delete_keep_the_aggregates_in_step(self):
+        client = APIClient()
+        for user, rating in zip(self.reviewers, (5, 4, 1)):
+            client.force_authenticate(user)
+            response = client.post(f"/api/catalog/products/{self.product.slug}/reviews/",
+                                    {"rating": rating, "comment": "ok"}, format="json")
+            self.assertEqual(response.status_code, 201, response.content)
+        self.assertStats(3, 10 / 3, {5: 1, 4: 1, 1: 1})
+
+        review = Review.objects.get(user=self.reviewers[2])
+        review.rating = 3
+        review.save()
+        self.assertStats(3, 4, {5: 1, 4: 1, 3: 1})
+
+        Review.objects.get(user=self.reviewers[0]).delete()
+        self.assertStats(2, 3.5, {4: 1, 3: 1})
+
+        self.assertEqual(rebuild_rating_stats(), 1)
+        self.assertStats(2, 3.5, {4: 1, 3: 1})
+
+    def test_aggregates_are_not_writable_through_forms_or_serializers(self):
+        serializer = ProductSerializer(self.product, data={"rating_avg": 5, "rating_count": 99, "rating_5": 99},
+                                       partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        self.assertStats(0, 0, {})
+        form_fields = modelform_factory(Product, fields="__all__").base_fields
+        self.assertFalse({"rating_avg", "rating_count", "rating_5"} & set(form_fields))
+
+
+class CartTests(TestCase):
+    def setUp(self):
+        self.user = make_user("9850000000")
+        self.seller = make_user("9850000001")
+        self.product = make_product(self.seller, "Mug", stock=50)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_line(self, cart, title):
+        category = Category.objects.create(name=f"{title} shelf")
+        product = make_product(self.seller, title, category=category)
+        ProductImage.objects.create(product=product, image=f"products/{product.slug}.jpg")
+        CartItem.objects.create(cart=cart, product=product, qty=1, price_snapshot=product.price)
+
+    def test_cart_costs_a_fixed_number_of_queries(self):
+        cart = Cart.objects.create(user=self.user)
+        for n in range(2):
+            self.add_line(cart, f"Plate {n}")
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.get("/api/catalog/cart/").status_code, 200)
+
+        for n in range(2, 8):
+            self.add_line(cart, f"Plate {n}")
+        with self.assertNumQueries(len(few.captured_queries)):
+            items = self.client.get("/api/catalog/cart/").json()["items"]
+
+        self.assertEqual(len(items), 8)
+        self.assertTrue(all(item["image"] for item in items))
+
+    def batch(self, operations):
+        return self.client.post("/api/catalog/cart/batch/", {"operations": operations}, format="json")
+
+    def test_batch_applies_operations_in_order(self):
+        bowl = make_product(self.seller, "Bowl")
+        plate = make_product(self.seller, "Plate")
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=plate, qty=1, price_snapshot=plate.price)
+
+        response = self.batch([
+            {"op": "add", "product": self.product.pk, "qty": 2},
+            {"op": "add", "product": self.product.pk, "qty": 3},
+            {"op": "set", "product": bowl.pk, "qty": 4},
+            {"op": "remove", "product": plate.pk},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({item["product"]: item["qty"] for item in response.json()["items"]},
+                         {self.product.pk: 5, bowl.pk: 4})
+
+    def test_batch_with_one_bad_operation_changes_nothing(self):
+        scarce = make_product(self.seller, "Scarce", stock=1)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product, qty=1, price_snapshot=self.product.price)
+
+        response = self.batch([
+            {"op": "set", "product": self.product.pk, "qty": 4},
+            {"op": "add", "product": scarce.pk, "qty": 2},
+            {"op": "add", "product": 999999, "qty": 1},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {"1", "2"})
+        self.assertEqual(list(cart.items.values_list("product_id", "qty")), [(self.product.pk, 1)])
+
+    def test_batch_is_capped_at_the_operation_limit(self):
+        add = {"op": "add", "product": self.product.pk, "qty": 0}
+
+        self.assertEqual(self.batch([add] * MAX_BATCH_OPERATIONS).status_code, 200)
+        response = self.batch([add] * (MAX_BATCH_OPERATIONS + 1))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.batch([]).status_code, 400)
+
+    def test_add_increments_the_line_a_concurrent_request_created_first(self):
+        cart = Cart.objects.create(user=self.user)
+        update = QuerySet.update
+        calls = []
+
+        def update_before_the_other_insert(queryset, **kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                # Our increment found no line; the other request inserts one right after.
+                CartItem.objects.create(cart=cart, product=self.product, qty=2, price_snapshot=self.product.price)
+                return 0
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, "update", autospec=True, side_effect=update_before_the_other_insert):
+            add_cart_line(cart, self.product, 3, price_snapshot=self.product.price)
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(CartItem.objects.get(cart=cart, product=self.product).qty, 5)
@@ -3,15 +3,17 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
-    CategoryListView, ProductListView, ProductDetailView, ProductReviewView,
-    CartView, CartAddView, CartUpdateItemView, CartClearView,
+    CategoryListView, ProductListView, ProductFacetView, ProductSuggestView, ProductDetailView, ProductRelatedView, ProductReviewView,
+    CartView, CartAddView, CartUpdateItemView, CartBatchView, GuestCartView, CartClearView,
     OrderListView, OrderCreateView,
-    SellerProductViewSet, ProductImageUploadView,
+    SellerProductViewSet, ProductImageUploadView, ProductImageReorderView,
     VoucherPurchaseView, VoucherListView,
     PaymentInitiateView, PaymentCallbackView, PaymentStatusView,
     AddressViewSet, SellerOrderListView, SellerOrderManagementView  # ✨ ADDED new views
 )
 
+from .admin_views import AdminCatalogExportView
+
 router = DefaultRouter()
 router.register('seller/products', SellerProductViewSet, basename='seller-products')
 router.register('addresses', AddressViewSet, basename='addresses')  # ✨ ADDED address routes
@@ -20,13 +22,18 @@ urlpatterns = [
     # Public Catalog
     path("categories/", CategoryListView.as_view(), name="categories"),
     path("products/", ProductListView.as_view(), name="product-list"),
+    path("products/facets/", ProductFacetView.as_view(), name="product-facets"),
+    path("products/suggest/", ProductSuggestView.as_view(), name="product-suggest"),
     path("products/<slug:slug>/", ProductDetailView.as_view(), name="product-detail"),
+    path("products/<slug:slug>/related/", ProductRelatedView.as_view(), name="product-related"),
     path("products/<slug:slug>/reviews/", ProductReviewView.as_view(), name="product-reviews"),
 
     # Cart
     path("cart/", CartView.as_view(), name="cart"),
     path("cart/add/", CartAddView.as_view(), name="cart-add"),
     path("cart/update-item/", CartUpdateItemView.as_view(), name="cart-update-item"),
+    path("cart/batch/", CartBatchView.as_view(), name="cart-batch"),
+    path("cart/guest/", GuestCartView.as_view(), name="cart-guest"),
     path("cart/clear/", CartClearView.as_view(), name="cart-clear"),
 
     # Orders (for customers)
@@ -44,10 +51,15 @@ urlpatterns = [
 
     # Seller Management
     path("seller/upload-image/", ProductImageUploadView.as_view(), name="seller-upload-image"),
+    path("seller/products/<int:pk>/images/reorder/", ProductImageReorderView.as_view(),
+         name="seller-product-images-reorder"),
     # ✨ ADDED new seller order management endpoints
     path("seller/orders/", SellerOrderListView.as_view(), name="seller-orders-list"),
     path("seller/orders/<int:id>/manage/", SellerOrderManagementView.as_view(), name="seller-order-manage"),
 
+    # Admin
+    path("admin/products/export/", AdminCatalogExportView.as_view(), name="admin-catalog-export"),
+
     # Include router URLs (for seller products and user addresses)
     path("", include(router.urls)),
 ]
@@ -0,0 +1,13 @@
+# catalog/utils.py
+
+from django.utils.crypto import get_random_string
+from django.utils.text import slugify
+
+
+def generate_product_slug(title):
+    """Slug for a new product; the random suffix keeps it unique across sellers."""
+    return f"{slugify(title)}-{get_random_string(6)}"
+
+
+def generate_product_sku():
+    return f"SKU-{get_random_string(8).upper()}"
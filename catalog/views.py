@@ -1,16 +1,35 @@
 import secrets, string, uuid
+from django.core.cache import cache
 from django.db import transaction
+from django.db.models import Count, Max, Prefetch
 from django.shortcuts import get_object_or_404
-from django.utils.crypto import get_random_string
-from django.utils.text import slugify
+from django.utils import timezone
 from rest_framework import status, permissions, viewsets, generics
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from .bulk import MAX_BULK_UPDATE_ITEMS, apply_product_changes
+from .cart import MAX_BATCH_OPERATIONS, add_cart_line, apply_cart_operations
+from .cache import CATALOG_CACHE_TIMEOUT, bump_catalog_version, catalog_cache_key
+from .conditional import ConditionalGetMixin, make_etag
+from .exporter import EXPORT_FORMATS, export_response
+from . import guest_cart
+from .facets import FILTER_PARAMS, get_facets
+from .idempotency import idempotent
+from .images import refresh_primary_image
+from .inventory import InsufficientStockError, commit_reservations, hold_stock, release_reservations
+from .importer import ProductImporter, detect_format
+from .jobs import enqueue
+from .listing import applied_ordering, product_listing_queryset
+from .pagination import StandardPagination, ProductKeysetPagination, ReviewKeysetPagination
+from .platform_settings import get_platform_settings
+from .suggest import DEFAULT_LIMIT, MAX_LIMIT, get_index
 from .permissions import IsSellerApproved  # ♻️ REFACTORED: Import custom permission
+from .utils import generate_product_slug, generate_product_sku
 from .models import (
     Category, Product, ProductImage, Cart, CartItem, Order, OrderItem,
-    Review, Voucher, PaymentTransaction, Address
+    Review, Voucher, PaymentTransaction, Address, RelatedProduct
 )
 from .serializers import (
     CategorySerializer, ProductListSerializer, ProductDetailSerializer,
@@ -18,7 +37,8 @@ from .serializers import (
     ReviewSerializer, CartSerializer, AddToCartSerializer,
     OrderSerializer, OrderCreateSerializer, SellerProductSerializer,  # ✨ ADDED OrderCreateSerializer
     VoucherSerializer, VoucherPurchaseSerializer, PaymentTransactionSerializer,
-    PaymentInitiateSerializer, AddressSerializer  # ✨ ADDED AddressSerializer
+    PaymentInitiateSerializer, AddressSerializer,  # ✨ ADDED AddressSerializer
+    ProductBulkUpdateItemSerializer, CartBatchOperationSerializer,
 )
 
 import secrets
@@ -39,48 +59,163 @@ from .serializers import (
     PaymentTransactionSerializer, PaymentInitiateSerializer
 )
 
-class StandardPagination(PageNumberPagination):
-    page_size = 12
-    page_size_query_param = "page_size"
-
-
 # --- Category & Product Views (No changes) ---
-class CategoryListView(generics.ListCreateAPIView):
+class CategoryListView(ConditionalGetMixin, generics.ListCreateAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    validators_cache_prefix = "category-list-validators"
+
+    def compute_validators(self):
+        # Count catches deletions, Max(updated_at) catches edits and additions.
+        state = Category.objects.aggregate(count=Count("id"), last_modified=Max("updated_at"))
+        etag = make_etag(state["count"], state["last_modified"], self.request.get_full_path())
+        return etag, state["last_modified"]
 
 
 class ProductListView(generics.ListAPIView):
     permission_classes = [permissions.AllowAny]
     serializer_class = ProductListSerializer
     pagination_class = StandardPagination
+    # Query params that shape the response; everything else is ignored by the cache key.
+    cache_query_params = FILTER_PARAMS + (
+        "search", "ordering", "page", "page_size",
+        "pagination", "cursor", "include_count",
+    )
+
+    @property
+    def paginator(self):
+        # ?pagination=cursor (or any ?cursor=) switches to keyset pages for infinite scroll.
+        if not hasattr(self, "_paginator"):
+            params = self.request.query_params
+            if params.get("pagination") == "cursor" or "cursor" in params:
+                self._paginator = ProductKeysetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_cache_key(self):
+        params = self.request.query_params
+        defaults = {"page": "1", "page_size": str(self.paginator.page_size)}
+        parts = [("host", self.request.get_host())]
+        for name in self.cache_query_params:
+            if name == "ordering":
+                # Keyed by the ordering actually applied (search defaults to relevance).
+                value = applied_ordering(params)
+            else:
+                value = (params.get(name) or defaults.get(name, "")).strip()
+            parts.append((name, value))
+        return catalog_cache_key("product-list", parts)
+
+    def list(self, request, *args, **kwargs):
+        # The listing is the same for every visitor, so one cached copy per query serves all.
+        cache_key = self.get_cache_key()
+        data = cache.get(cache_key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            cache.set(cache_key, data, CATALOG_CACHE_TIMEOUT)
+        data = self.with_live_stock(data)
+        if request.query_params.get("facets") in ("1", "true"):
+            data = {**data, "facets": get_facets(Product.objects.filter(is_active=True), request.query_params)}
+        return Response(data)
+
+    def with_live_stock(self, data):
+        """
+        Checkout holds don't bump the catalog version (see catalog.inventory),
+        so cached pages refresh their available stock with one primary key lookup.
+        """
+        results = data["results"]
+        rows = Product.objects.filter(pk__in=[item["id"] for item in results]).values_list("id", "stock", "reserved")
+        available = {product_id: max(stock - reserved, 0) for product_id, stock, reserved in rows}
+        for item in results:
+            item["stock"] = available.get(item["id"], item["stock"])
+        return data
 
     def get_queryset(self):
-        queryset = Product.objects.filter(is_active=True).select_related("category", "seller").prefetch_related(
-            "images")
-        category_slug = self.request.query_params.get("category__slug")
-        search = self.request.query_params.get("search")
-        ordering = self.request.query_params.get("ordering", "-created_at")
+        return product_listing_queryset(self.request.query_params)
 
-        if category_slug:
-            queryset = queryset.filter(category__slug=category_slug)
-        if search:
-            queryset = queryset.filter(title__icontains=search)
 
-        return queryset.order_by(ordering)
+class ProductFacetView(APIView):
+    """
+    Facet counts (brand, category, price range, in stock, preorder) for the
+    listing filters given in the query string.
+    GET: /api/catalog/products/facets/
+    """
+    permission_classes = [permissions.AllowAny]
 
+    def get(self, request):
+        return Response(get_facets(Product.objects.filter(is_active=True), request.query_params))
 
-class ProductDetailView(generics.RetrieveAPIView):
+
+class ProductSuggestView(APIView):
+    """
+    Typeahead completions (product titles, brands, categories) for a prefix,
+    served from the in-process index in catalog.suggest.
+    GET: /api/catalog/products/suggest/?q=gal&limit=8
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        query = request.query_params.get("q", "")
+        try:
+            limit = min(max(int(request.query_params.get("limit", DEFAULT_LIMIT)), 1), MAX_LIMIT)
+        except ValueError:
+            limit = DEFAULT_LIMIT
+        return Response({"query": query, "suggestions": get_index().lookup(query, limit)})
+
+
+class ProductDetailView(ConditionalGetMixin, generics.RetrieveAPIView):
     permission_classes = [permissions.AllowAny]
-    queryset = Product.objects.filter(is_active=True).prefetch_related("images")
+    queryset = Product.objects.filter(is_active=True).select_related(
+        "category", "primary_image").prefetch_related("images")
     serializer_class = ProductDetailSerializer
     lookup_field = 'slug'
+    validators_cache_prefix = "product-detail-validators"
+
+    def get_validators_cache_params(self):
+        return [("host", self.request.get_host()), ("slug", self.kwargs["slug"])]
+
+    def compute_validators(self):
+        # Image uploads, deletes and reorders touch Product.updated_at (see catalog.images),
+        # so the product and category timestamps cover the whole payload.
+        state = (
+            Product.objects.filter(slug=self.kwargs["slug"], is_active=True)
+            .values("id", "updated_at", "category_id", "category__updated_at")
+            .first()
+        )
+        if state is None:
+            return None
+        etag = make_etag(state["id"], state["updated_at"], state["category_id"],
+                         state["category__updated_at"], self.request.get_host())
+        last_modified = max(filter(None, (state["updated_at"], state["category__updated_at"])))
+        return etag, last_modified
+
+
+class ProductRelatedView(APIView):
+    """
+    Precomputed recommendations for a product (see catalog.related), read
+    with one query over the (product, rank) index.
+    GET: /api/catalog/products/<slug>/related/
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, slug):
+        entries = (
+            RelatedProduct.objects.filter(product__slug=slug, product__is_active=True, related__is_active=True)
+            .select_related("related__category", "related__primary_image")
+            .order_by("rank")
+        )
+        products = [entry.related for entry in entries]
+        return Response(ProductListSerializer(products, many=True, context={"request": request}).data)
 
 
 # --- Review View (No changes) ---
 class ProductReviewView(generics.ListCreateAPIView):
+    """
+    Reviews of a product, cursor paginated. ?sort=recent (default) or ?sort=highest.
+    """
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = ReviewKeysetPagination
 
     def get_queryset(self):
         return Review.objects.filter(product__slug=self.kwargs['slug']).select_related("user")
@@ -91,14 +226,20 @@ class ProductReviewView(generics.ListCreateAPIView):
 
 
 # --- Cart Views ---
+def get_cart_for_display(user):
+    """Loads the user's cart with everything CartSerializer renders in two queries."""
+    items = CartItem.objects.select_related("product__category", "product__primary_image")
+    cart, _ = Cart.objects.prefetch_related(Prefetch("items", queryset=items)).get_or_create(user=user)
+    return cart
+
+
 # ... (No major changes to CartView, CartUpdateItemView, CartClearView)
 class CartView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = CartSerializer
 
     def get_object(self):
-        cart, _ = Cart.objects.get_or_create(user=self.request.user)
-        return cart
+        return get_cart_for_display(self.request.user)
 
 
 class CartAddView(APIView):
@@ -116,15 +257,9 @@ class CartAddView(APIView):
         cart, _ = Cart.objects.get_or_create(user=request.user)
         deposit_snap = deposit_amount if is_preorder else (product.price + product.gst_amount)
 
-        item, created = CartItem.objects.get_or_create(
-            cart=cart, product=product,
-            defaults={"qty": qty, "price_snapshot": product.price,"preorder_deposit_snapshot": deposit_snap}
-        )
-        if not created:
-            item.qty += qty
-            item.save()
+        add_cart_line(cart, product, qty, price_snapshot=product.price, preorder_deposit_snapshot=deposit_snap)
 
-        cart_serializer = CartSerializer(cart, context={"request": request})
+        cart_serializer = CartSerializer(get_cart_for_display(request.user), context={"request": request})
         return Response(cart_serializer.data, status=status.HTTP_200_OK)
 
 
@@ -139,15 +274,67 @@ class CartUpdateItemView(APIView):
         if qty <= 0:
             item.delete()
         else:
-            if item.product.stock < qty:
+            if item.product.available_stock < qty:
                 return Response({"detail": f"Insufficient stock for {item.product.title}."}, status=400)
             item.qty = qty
             item.save()
 
-        cart = Cart.objects.get(user=request.user)
+        cart = get_cart_for_display(request.user)
+        return Response(CartSerializer(cart, context={"request": request}).data)
+
+
+class CartBatchView(APIView):
+    """
+    Applies many cart operations atomically and returns the cart once.
+    POST: /api/catalog/cart/batch/
+      {"operations": [{"op": "add", "product": 1, "qty": 2}, {"op": "set", "product": 2, "qty": 0},
+                      {"op": "remove", "product": 3}]}
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        operations = request.data.get("operations") if isinstance(request.data, dict) else request.data
+        # The list length is checked before any operation is validated.
+        serializer = CartBatchOperationSerializer(
+            data=operations, many=True, allow_empty=False, max_length=MAX_BATCH_OPERATIONS
+        )
+        serializer.is_valid(raise_exception=True)
+        apply_cart_operations(request.user, serializer.validated_data)
+        cart = get_cart_for_display(request.user)
         return Response(CartSerializer(cart, context={"request": request}).data)
 
 
+class GuestCartView(APIView):
+    """
+    Cart for anonymous shoppers, stored in the cache (see catalog.guest_cart).
+    Send the returned token back in the X-Guest-Cart header; it is merged
+    into the user's cart on login.
+    GET:  /api/catalog/cart/guest/
+    POST: /api/catalog/cart/guest/  same body as /cart/batch/
+    """
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+
+    def get(self, request):
+        token = request.headers.get(guest_cart.GUEST_CART_HEADER)
+        if not guest_cart.cache_key(token):
+            token = guest_cart.new_token()
+        return Response(guest_cart.render(request, token, guest_cart.load(token)))
+
+    def post(self, request):
+        operations = request.data.get("operations") if isinstance(request.data, dict) else request.data
+        # The list length is checked before any operation is validated.
+        serializer = CartBatchOperationSerializer(
+            data=operations, many=True, allow_empty=False, max_length=MAX_BATCH_OPERATIONS
+        )
+        serializer.is_valid(raise_exception=True)
+        token = request.headers.get(guest_cart.GUEST_CART_HEADER)
+        if not guest_cart.cache_key(token):
+            token = guest_cart.new_token()
+        lines, products = guest_cart.apply_operations(token, serializer.validated_data)
+        return Response(guest_cart.render(request, token, lines, products))
+
+
 class CartClearView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -170,13 +357,18 @@ class AddressViewSet(viewsets.ModelViewSet):
 
 
 # --- Order Views ---
+def order_items_prefetch():
+    """Order lines with what OrderItemSerializer's GST amounts read from."""
+    return Prefetch("items", queryset=OrderItem.objects.select_related("product__category"))
+
+
 class OrderListView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = OrderSerializer
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).prefetch_related("items", "shipping_address").order_by(
-            '-created_at')
+        return Order.objects.filter(user=self.request.user).prefetch_related(
+            order_items_prefetch(), "shipping_address").order_by('-created_at')
 
 
 # ♻️ REFACTORED: Order creation now uses a dedicated serializer for address and voucher.
@@ -184,6 +376,7 @@ class OrderCreateView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = OrderCreateSerializer
 
+    @idempotent("orders.create")
     @transaction.atomic
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -191,40 +384,42 @@ class OrderCreateView(generics.CreateAPIView):
         validated_data = serializer.validated_data
 
         cart = get_object_or_404(Cart, user=request.user)
-        if not cart.items.exists():
+        items = list(cart.items.select_related("product__category"))
+        if not items:
             return Response({"detail": "Cart is empty."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Check stock for all items before proceeding
-        for item in cart.items.select_related("product"):
-            if item.product.stock < item.qty:
-                return Response({"detail": f"Insufficient stock for {item.product.title}."}, status=400)
-
         order = Order.objects.create(
             user=request.user,
             shipping_address=validated_data['address_id'],
             voucher=validated_data.get('voucher_code')
         )
 
-        order_items = []
-        for item in cart.items.all():
-            product = item.product
-        if getattr(product, "is_prebook_enabled", False):
-            price_to_charge = product.prebook_amount
-            is_prebook = True
-        else:
-            price_to_charge = item.price_snapshot
-            is_prebook = False
-            product.stock -= item.qty
-            product.save(update_fields=["stock"])
-            order_items.append(OrderItem(
-                order=order, product=product,
-                title_snapshot=product.title, price_snapshot=item.price_snapshot, qty=item.qty,is_prebook=is_prebook
-            ))
-        OrderItem.objects.bulk_create(order_items)
-
-        order.calculate_totals()  # This now handles discounts
+        # Pre-order lines are not shipped from current stock, so only the others hold it.
+        # The hold lasts until the payment succeeds, fails or expires (see catalog.inventory).
+        stock_needed = {}
+        for item in items:
+            if not item.product.is_preorder:
+                stock_needed[item.product_id] = stock_needed.get(item.product_id, 0) + item.qty
+        try:
+            hold_stock(order, stock_needed)
+        except InsufficientStockError as exc:
+            transaction.set_rollback(True)
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order, product=item.product, title_snapshot=item.product.title,
+                price_snapshot=item.price_snapshot, qty=item.qty, is_prebook=item.product.is_preorder,
+            )
+            for item in items
+        ])
+
+        order.calculate_totals(get_platform_settings().platform_commission_rate)  # This now handles discounts
         cart.items.all().delete()
+        # Post-order work runs in `run_jobs` workers; the row commits with the order.
+        enqueue("catalog.notify_order_placed", {"order_id": order.pk})
 
+        order = Order.objects.select_related("shipping_address", "voucher").prefetch_related(
+            order_items_prefetch()).get(pk=order.pk)
         output_serializer = OrderSerializer(order, context={'request': request})
         return Response(output_serializer.data, status=status.HTTP_201_CREATED)
 
@@ -242,11 +437,54 @@ class SellerProductViewSet(viewsets.ModelViewSet):
             return ProductCreateSerializer
         return SellerProductSerializer
 
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_products(self, request):
+        """
+        Bulk-creates products from an uploaded CSV or JSONL file (form field `file`).
+        Returns the number created and a per-row error report.
+        POST: /api/catalog/seller/products/import/
+        """
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({"detail": "No file provided."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            fmt = detect_format(upload.name, request.data.get('file_format'))
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = ProductImporter(seller=request.user).run(upload, fmt)
+        code = status.HTTP_201_CREATED if report["created"] else status.HTTP_400_BAD_REQUEST
+        return Response(report, status=code)
+
+    @action(detail=False, methods=['post'], url_path='bulk-update')
+    def bulk_update(self, request):
+        """
+        Applies up to MAX_BULK_UPDATE_ITEMS price/mrp/stock/is_active changes,
+        matched by id or sku, to the seller's own products in set-based UPDATEs.
+        POST: /api/catalog/seller/products/bulk-update/  {"items": [{"sku": ..., "stock": ...}, ...]}
+        """
+        items = request.data.get('items') if isinstance(request.data, dict) else request.data
+        serializer = ProductBulkUpdateItemSerializer(
+            data=items, many=True, allow_empty=False, max_length=MAX_BULK_UPDATE_ITEMS
+        )
+        serializer.is_valid(raise_exception=True)
+        updated, errors = apply_product_changes(request.user, serializer.validated_data)
+        return Response({"updated": updated, "errors": errors})
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request):
+        """
+        Streams the seller's products as CSV (default) or JSONL.
+        GET: /api/catalog/seller/products/export/?file_format=csv|jsonl
+        """
+        fmt = request.query_params.get('file_format', 'csv')
+        if fmt not in EXPORT_FORMATS:
+            return Response({"detail": "file_format must be csv or jsonl."}, status=status.HTTP_400_BAD_REQUEST)
+        return export_response(Product.objects.filter(seller=request.user), fmt, "products")
+
     def perform_create(self, serializer):
-        title = serializer.validated_data['title']
-        slug = f"{slugify(title)}-{get_random_string(6)}"
-        sku = f"SKU-{get_random_string(8).upper()}"
-        serializer.save(seller=self.request.user, slug=slug, sku=sku)
+        slug = generate_product_slug(serializer.validated_data['title'])
+        serializer.save(seller=self.request.user, slug=slug, sku=generate_product_sku())
 
     # ♻️ REFACTORED: Simplified create/update methods using DRF defaults, which is cleaner.
     def create(self, request, *args, **kwargs):
@@ -288,6 +526,36 @@ class ProductImageUploadView(APIView):
         return Response(images_data, status=status.HTTP_201_CREATED)
 
 
+class ProductImageReorderView(APIView):
+    """
+    Sets the display order of a product's images; the first becomes the primary image.
+    POST: /api/catalog/seller/products/<pk>/images/reorder/  {"order": [image ids]}
+    """
+    permission_classes = [IsSellerApproved]
+
+    def post(self, request, pk):
+        product = get_object_or_404(Product, pk=pk, seller=request.user)
+        order = request.data.get("order")
+        images = {img.id: img for img in product.images.all()}
+        try:
+            order = [int(image_id) for image_id in order]
+        except (TypeError, ValueError):
+            return Response({"detail": "order must be a list of image ids."}, status=status.HTTP_400_BAD_REQUEST)
+        if sorted(order) != sorted(images):
+            return Response({"detail": "order must list every image of the product exactly once."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        for position, image_id in enumerate(order):
+            images[image_id].position = position
+        with transaction.atomic():
+            ProductImage.objects.bulk_update(images.values(), ["position"])
+            refresh_primary_image(product.pk)
+        transaction.on_commit(bump_catalog_version)
+
+        ordered = sorted(images.values(), key=lambda img: img.position)
+        return Response(ProductImageSerializer(ordered, many=True, context={"request": request}).data)
+
+
 # ✨ ADDED: View for sellers to list their orders and update status.
 class SellerOrderListView(generics.ListAPIView):
     permission_classes = [IsSellerApproved]
@@ -378,6 +646,7 @@ class PaymentInitiateView(APIView):
     """
     permission_classes = [IsAuthenticated]
 
+    @idempotent("payment.initiate")
     def post(self, request):
         serializer = PaymentInitiateSerializer(data=request.data)
         if serializer.is_valid():
@@ -458,25 +727,34 @@ class PaymentCallbackView(APIView):
             return Response({"detail": "Transaction ID is missing in callback data."}, status=status.HTTP_400_BAD_REQUEST)
 
         payment_transaction = get_object_or_404(PaymentTransaction, transaction_id=transaction_id)
-        order = payment_transaction.order
+        # Locked so a replayed callback cannot settle the order twice.
+        order = Order.objects.select_for_update().get(pk=payment_transaction.order_id)
 
         # Verify the authenticity of the callback (critical for security)
         is_payment_successful = self._process_gateway_response(gateway, request.data, payment_transaction)
 
-        if is_payment_successful:
-            payment_transaction.status = 'success'
-            order.payment_status = 'completed'
-            order.status = 'paid'
-        else:
-            payment_transaction.status = 'failed'
-            order.payment_status = 'failed'
-
+        payment_transaction.status = 'success' if is_payment_successful else 'failed'
         # Store the full response from the gateway for auditing
         payment_transaction.gateway_response = request.data
         payment_transaction.save()
-        order.save(update_fields=['payment_status', 'status'])
 
-        # You can also trigger post-payment actions here, like sending emails.
+        # Only a pending, unpaid order is settled; replayed or late callbacks for
+        # paid, shipped or cancelled orders are recorded above and change nothing.
+        if order.status == 'pending' and order.payment_status != 'completed':
+            if is_payment_successful:
+                order.payment_status = 'completed'
+                order.status = 'paid'
+                commit_reservations(order)
+                enqueue("catalog.record_order_sales",
+                        {"order_id": order.id, "paid_at": timezone.now().isoformat()})
+                enqueue("catalog.notify_payment_result", {"order_id": order.id, "succeeded": True})
+            else:
+                order.payment_status = 'failed'
+                release_reservations(order)
+                enqueue("catalog.notify_payment_result", {"order_id": order.id, "succeeded": False})
+            order.save(update_fields=['payment_status', 'status'])
+
+        # Further post-payment work (emails, invoices) belongs in catalog.tasks, enqueued above.
 
         return Response({
             'status': 'success' if is_payment_successful else 'failed',
@@ -138,6 +138,27 @@ DATABASES = {
     }
 }
 
+# Cache
+# Catalog listings, facets and their version key live here, so production needs a
+# cache shared by every worker: set REDIS_URL (e.g. redis://localhost:6379/1), or
+# CACHE_BACKEND/CACHE_LOCATION for another shared backend. The per-process LocMemCache
+# fallback is for development; `check --deploy` fails on it when DEBUG is off.
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+            'LOCATION': config('CACHE_LOCATION', default='zirvanaa'),
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 